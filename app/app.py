@@ -1,39 +1,96 @@
-from os import environ
+import json
+from os import environ, path
 import logging
 from uuid import uuid4
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 
-from blkchn import Blockchain
+from blkchn import Blockchain, encoding
+from blkchn.daemon import Miner
+from blkchn.jobs import MiningJobs
+from blkchn.ledger import Ledger
+from blkchn.mempool import Mempool, MempoolFull
+from blkchn.storage import SegmentStore
 
 
 app = Flask(__name__)
 logging.basicConfig(level=logging.DEBUG)
 node_identifier = str(uuid4()).replace('-', '')
-blockchain = Blockchain()
+blockchain = Blockchain(
+    workers=int(environ.get('MINING_WORKERS', 1)),
+    storage=SegmentStore(environ['CHAIN_DIR']) if 'CHAIN_DIR' in environ else None,
+    mempool=Mempool(
+        max_count=int(environ['MEMPOOL_MAX_TRANSACTIONS']) if 'MEMPOOL_MAX_TRANSACTIONS' in environ else None,
+        max_bytes=int(environ['MEMPOOL_MAX_BYTES']) if 'MEMPOOL_MAX_BYTES' in environ else None,
+        eviction=environ.get('MEMPOOL_EVICTION', 'oldest'),
+    ),
+    max_block_size=int(environ['MAX_BLOCK_SIZE']) if 'MAX_BLOCK_SIZE' in environ else None,
+    ledger=Ledger(path.join(environ['CHAIN_DIR'], 'ledger.json') if 'CHAIN_DIR' in environ else None),
+    reject_overspends=environ.get('REJECT_OVERSPENDS', '').lower() in ('1', 'true', 'yes'),
+)
 
+# We must receive a reward for finding the proof.
+# The sender is `0` to signify that this node has mined a new coin.
+jobs = MiningJobs(blockchain, reward=lambda: {'sender': '0', 'recipient': node_identifier, 'amount': 1})
+miner = Miner(blockchain, reward=jobs.reward)
 
-@app.route('/mine', methods=['GET'])
+if environ.get('CONTINUOUS_MINING', '').lower() in ('1', 'true', 'yes'):
+    miner.start()
+
+
+@app.route('/mine', methods=['GET', 'POST'])
 def mine():
-    # We run the proof of work algorithm to get the next proof...
-    last_block = blockchain.last_block
-    proof = blockchain.proof_of_work(last_block)
+    """Starts mining a new block in the background.
+
+    The proof of work search runs on a background thread, so the request returns straight away with the id of
+    the job, which `/mine/<job_id>` reports on. The search starts again if the chain changes underneath it.
 
-    # We must receive a reward for finding the proof.
-    # The sender is `0` to signify that this node has mined a new coin.
-    blockchain.new_transaction({'sender': '0', 'recipient': node_identifier, 'amount': 1})
+    Returns:
+      202: With the job
 
-    # Forge the new Block by adding it to the chain
-    previous_hash = blockchain.hash(last_block)
-    block = blockchain.new_block(proof, previous_hash)
+    """
+    job = jobs.submit()
 
-    return jsonify({
-        'message': 'New Block Forged',
-        'index': block['index'],
-        'transactions': block['transactions'],
-        'proof': block['proof'],
-        'previous_hash': block['previous_hash'],
-    }), 200
+    return jsonify(job.to_dict()), 202, {'Location': f'/mine/{job.id}'}
+
+
+@app.route('/mine/<job_id>', methods=['GET'])
+def mining_job(job_id):
+    """Returns the status of a mining job, and the block it forged once it is done."""
+    job = jobs.get(job_id)
+
+    if job is None:
+        return 'Unknown job', 404
+
+    return jsonify(job.to_dict()), 200
+
+
+@app.route('/mine/<job_id>', methods=['DELETE'])
+def cancel_mining_job(job_id):
+    """Cancels a mining job that has not finished."""
+    job = jobs.cancel(job_id)
+
+    if job is None:
+        return 'Unknown job', 404
+
+    return jsonify(job.to_dict()), 200
+
+
+@app.route('/miner', methods=['GET'])
+def miner_status():
+    """Returns the state of the continuous miner and the block template it is working on."""
+    return jsonify(miner.status()), 200
+
+
+@app.route('/miner', methods=['POST', 'DELETE'])
+def toggle_miner():
+    """Starts (POST) or stops (DELETE) the continuous miner."""
+    if request.method == 'POST':
+        miner.start()
+    else:
+        miner.stop()
+
+    return jsonify(miner.status()), 200
 
 
 @app.route('/transactions/new', methods=['POST'])
@@ -47,27 +104,272 @@ def new_transaction():
     Returns:
       201: On Creation
       400: Invalid JSON sent to server
+      503: The mempool is full
 
     """
-    values = request.get_json()
+    try:
+        blockchain.new_transaction(transaction_from(request.get_json()))
+    except ValueError as error:
+        return str(error), 400
+    except MempoolFull as error:
+        return str(error), 503
+
+    return '', 201
+
 
-    if not all(k in values for k in ['sender', 'recipient', 'amount']):
-        return 'Missing values', 400
+def transaction_from(values) -> dict:
+    """Picks the fields of a transaction out of submitted JSON
+
+    Raises:
+      ValueError: If a required field is missing
+
+    """
+    if not isinstance(values, dict) or not all(k in values for k in ['sender', 'recipient', 'amount']):
+        raise ValueError('Missing values')
 
-    blockchain.new_transaction({
+    transaction = {
         'sender': values['sender'],
         'recipient': values['recipient'],
         'amount': values['amount']
-    })
+    }
 
-    return '', 201
+    if 'fee' in values:
+        transaction['fee'] = values['fee']
+
+    return transaction
+
+
+def submitted_batch():
+    """Yields each transaction of a batch, or the ValueError raised reading it
+
+    The batch is either a JSON array, or NDJSON (`application/x-ndjson`), which is read from the request
+    line by line rather than parsed as a whole.
+
+    Raises:
+      ValueError: If the body is not a JSON array
+
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        for line in request.stream:
+            if line.strip():
+                try:
+                    yield transaction_from(json.loads(line))
+                except ValueError as error:
+                    yield error
+
+        return
+
+    values = request.get_json(silent=True)
+
+    if not isinstance(values, list):
+        raise ValueError('Expected a JSON array of transactions.')
+
+    for item in values:
+        try:
+            yield transaction_from(item)
+        except ValueError as error:
+            yield error
+
+
+@app.route('/transactions/batch', methods=['POST'])
+def new_transactions():
+    """Stores a batch of new transactions, sent as a JSON array or as NDJSON.
+
+    Every well formed transaction in the batch is added to the mempool in one locked operation, and the
+    outcome of each is reported in order: `added`, `duplicate` if it was already pending, `invalid`, or
+    `rejected` if the mempool is full.
+
+    Returns:
+      200: With a result for each transaction
+      400: The body is not a JSON array
+
+    """
+    try:
+        batch = list(submitted_batch())
+    except ValueError as error:
+        return str(error), 400
+
+    outcomes = iter(blockchain.new_transactions(item for item in batch if not isinstance(item, ValueError)))
+    results = []
+
+    for item in batch:
+        key, outcome = (None, item) if isinstance(item, ValueError) else next(outcomes)
+
+        if outcome is True or outcome is False:
+            results.append({'id': key, 'status': 'added' if outcome else 'duplicate'})
+        else:
+            status = 'rejected' if isinstance(outcome, MempoolFull) else 'invalid'
+            results.append({'id': key, 'status': status, 'error': str(outcome)})
+
+    return jsonify({
+        'results': results,
+        'added': sum(result['status'] == 'added' for result in results),
+    }), 200
+
+
+@app.route('/transactions/<txid>', methods=['GET'])
+def transaction(txid):
+    """Returns a transaction by id, with the indexes of the blocks holding it, or whether it is pending."""
+    found = blockchain.find_transaction(txid)
+
+    if found is None:
+        return 'Unknown transaction', 404
+
+    return jsonify(found), 200
+
+
+@app.route('/balance/<address>', methods=['GET'])
+def balance(address):
+    """Returns the balance of an address on our chain, and how much of it its pending transactions spend."""
+    return jsonify({
+        'address': address,
+        'balance': blockchain.balance(address),
+        'pending': blockchain.mempool.spending.get(address, 0),
+    }), 200
+
+
+@app.route('/addresses/<address>/transactions', methods=['GET'])
+def address_transactions(address):
+    """Returns a page of the transactions an address sent or received, chosen by `role`, `offset` and `limit`."""
+    try:
+        page = blockchain.address_transactions(
+            address,
+            role=request.args.get('role'),
+            offset=max(request.args.get('offset', default=0, type=int), 0),
+            limit=max(request.args.get('limit', default=100, type=int), 0),
+        )
+    except ValueError as error:
+        return str(error), 400
+
+    return jsonify({'address': address, 'transactions': page}), 200
+
+
+def requested_start():
+    """Works out the position of the first block a request for part of the chain wants
+
+    The start can be given as a block index (`from`), as the hash of the block before it (`since`), or as a
+    block locator of the requesting node's chain (`locator`, repeated), in which case the blocks after the
+    last one both chains share are sent.
+
+    Returns:
+      int: A position on our chain, or None if `since` names a block we don't have
+
+    """
+    if 'locator' in request.args:
+        return blockchain.locate(request.args.getlist('locator'))
+
+    if 'since' in request.args:
+        position = blockchain.position({request.args['since']})
+        return None if position is None else position + 1
+
+    return max(request.args.get('from', default=1, type=int), 1) - 1
+
+
+def requested_stop(start: int) -> int:
+    """Works out the position just past the last block a request for part of the chain wants
+
+    The window ends at the block with index `to`, if given, and holds at most `limit` blocks.
+
+    Returns:
+      int: A position on our chain, no earlier than `start`
+
+    """
+    stop = len(blockchain.chain)
+
+    if 'to' in request.args:
+        stop = min(stop, request.args.get('to', type=int) or 0)
+
+    if 'limit' in request.args:
+        stop = min(stop, start + max(request.args.get('limit', type=int) or 0, 0))
+
+    return max(stop, start)
 
 
 @app.route('/chain', methods=['GET'])
 def full_chain():
-    """Returns the whole blockchain."""
+    """Returns the whole blockchain, or a window of it.
+
+    The window starts at the block selected by `from`, `since` or `locator`, and is bounded by `to` and `limit`.
+
+    The response is streamed, generated a block at a time, so the chain is never held in memory as one
+    response. With `format=binary` the blocks are sent in their canonical binary encoding, as length prefixed
+    records, and with `format=ndjson` as one JSON object per line. In both cases the index of the first block
+    and the length of the chain are sent as headers.
+
+    """
+    start = requested_start()
+
+    if start is None:
+        return 'Unknown block', 404
+
+    length = len(blockchain.chain)
+    blocks = blockchain.blocks(start, requested_stop(start))
+    headers = {'X-Chain-Start': str(start + 1), 'X-Chain-Length': str(length)}
+
+    if request.args.get('format') == 'binary':
+        return Response(encoding.encode_chain(blocks), mimetype='application/octet-stream', headers=headers)
+
+    if request.args.get('format') == 'ndjson':
+        return Response((json.dumps(block.to_dict()) + '\n' for block in blocks),
+                        mimetype='application/x-ndjson', headers=headers)
+
+    def generate():
+        yield '{"chain": ['
+
+        for position, block in enumerate(blocks):
+            yield (',' if position else '') + json.dumps(block.to_dict())
+
+        yield f'], "start": {start + 1}, "length": {length}}}\n'
+
+    return Response(generate(), mimetype='application/json', headers=headers)
+
+
+@app.route('/chain/headers', methods=['GET'])
+def chain_headers():
+    """Returns block headers, so that peers can pick the best chain before fetching blocks."""
+    start = requested_start()
+
+    if start is None:
+        return 'Unknown block', 404
+
+    return jsonify({
+        'headers': [block.header for block in blockchain.blocks(start, requested_stop(start))],
+        'start': start + 1,
+        'length': len(blockchain.chain),
+    }), 200
 
-    return jsonify({'chain': blockchain.chain, 'length': len(blockchain.chain)}), 200
+
+@app.route('/blocks/<int:index>', methods=['GET'])
+def block_by_index(index):
+    """Returns the block with an index."""
+    block = blockchain.block(index)
+
+    if block is None:
+        return 'Unknown block', 404
+
+    return jsonify(dict(block.to_dict(), hash=block.hash)), 200
+
+
+@app.route('/blocks/by-hash/<block_hash>', methods=['GET'])
+def block_by_hash(block_hash):
+    """Returns the block with a hash."""
+    block = blockchain.block_by_hash(block_hash)
+
+    if block is None:
+        return 'Unknown block', 404
+
+    return jsonify(dict(block.to_dict(), hash=block.hash)), 200
+
+
+@app.route('/blocks/<int:index>/transactions/<int:position>/proof', methods=['GET'])
+def transaction_proof(index, position):
+    """Returns a Merkle inclusion proof for a transaction, to check against the block's header."""
+    try:
+        return jsonify(blockchain.merkle_proof(index, position)), 200
+    except IndexError:
+        return 'Unknown transaction', 404
+    except ValueError as error:
+        return str(error), 400
 
 
 @app.route('/nodes/register', methods=['POST'])
@@ -92,9 +394,18 @@ def register_nodes():
 def consensus():
     """Resolves a chain by requesting consensus on the network."""
     if blockchain.resolve_conflicts():
-        return jsonify({'message': 'Our chain was replaced', 'new_chain': blockchain.chain}), 200
+        message = 'Our chain was replaced'
     else:
-        return jsonify({'message': 'Our chain is authoritative', 'new_chain': blockchain.chain}), 200
+        message = 'Our chain is authoritative'
+
+    # The chain itself can be paged through with `/chain`, rather than sent whole
+    last_block = blockchain.last_block
+
+    return jsonify({
+        'message': message,
+        'length': len(blockchain.chain),
+        'last_block': dict(last_block.to_dict(), hash=last_block.hash),
+    }), 200
 
 
 if __name__ == '__main__':
@@ -0,0 +1,52 @@
+"""Reports the memory used per block by plain dictionaries and by sealed, slotted Blocks.
+
+Usage:
+
+  python -m benchmarks.bench_memory [--blocks 1000000]
+
+"""
+from argparse import ArgumentParser
+import tracemalloc
+
+from blkchn.block import Block
+
+
+def make_fields(position: int) -> dict:
+    """Returns the fields of a typical block, holding the mining reward transaction."""
+    return {
+        'index': position + 1,
+        'created_at': 1600000000.0 + position * 10,
+        'transactions': [{'sender': '0', 'recipient': f'{position:032x}', 'amount': 1}],
+        'proof': position * 7,
+        'previous_hash': f'{position:064x}',
+        'difficulty': 16,
+    }
+
+
+def measure(build, blocks: int) -> float:
+    """Returns the bytes allocated per block to keep `blocks` blocks made by `build` alive."""
+    tracemalloc.start()
+    chain = [build(position) for position in range(blocks)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del chain
+
+    return size / blocks
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--blocks', type=int, default=1000000)
+    args = parser.parse_args()
+
+    # The block hash is passed in, so both measurements hold the same strings and only their containers differ
+    before = measure(lambda position: dict(make_fields(position), hash=f'{position:064x}'), args.blocks)
+    after = measure(lambda position: Block(make_fields(position), f'{position:064x}'), args.blocks)
+
+    print(f'{args.blocks:,} blocks')
+    print(f'  dict:  {before:,.0f} bytes per block')
+    print(f'  Block: {after:,.0f} bytes per block ({after / before:.0%})')
+
+
+if __name__ == '__main__':
+    main()
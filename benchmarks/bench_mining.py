@@ -0,0 +1,35 @@
+"""Reports Proof of Work hashes/second for an increasing number of worker processes.
+
+Usage:
+
+  python -m benchmarks.bench_mining [--rounds 5] [--max-workers N]
+
+"""
+from argparse import ArgumentParser
+import os
+from time import perf_counter
+
+from blkchn import mining
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=5, help='Proofs to find per worker count')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    for workers in range(1, args.max_workers + 1):
+        hashes = 0
+        started = perf_counter()
+
+        for last_proof in range(args.rounds):
+            # The workers stride the nonce space evenly, so the winning nonce is a good
+            # estimate of the number of hashes tried between them.
+            hashes += mining.search(last_proof, '0' * 64, workers=workers) + 1
+
+        elapsed = perf_counter() - started
+        print(f'{workers:>3} workers: {hashes / elapsed:>12,.0f} hashes/s ({elapsed:.2f}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Compares sequential and parallel validation of chains of increasing length.
+
+Usage:
+
+  python -m benchmarks.bench_validation [--blocks 10000 100000 1000000] [--workers N]
+
+"""
+from argparse import ArgumentParser
+import os
+from time import perf_counter, time
+
+from blkchn import Blockchain, mining
+from blkchn.block import digest
+
+
+def build_chain(blockchain: Blockchain, length: int) -> list:
+    """Mines a chain of plain dictionaries, spaced so that the difficulty never retargets
+
+    The genesis block is backdated by the span of the chain, so that no block is stamped in the future.
+
+    """
+    genesis = dict(blockchain.chain[0].to_dict(), created_at=int(time() - length * blockchain.block_interval))
+    chain = [genesis]
+    last_hash = digest(genesis)
+
+    for position in range(1, length):
+        last_block = chain[-1]
+        block = {
+            'index': position + 1,
+            'created_at': genesis['created_at'] + position * blockchain.block_interval,
+            'transactions': [],
+            'proof': mining.scan(last_block['proof'], last_hash, blockchain.difficulty),
+            'previous_hash': last_hash,
+            'difficulty': blockchain.difficulty,
+        }
+        chain.append(block)
+        last_hash = digest(block)
+
+    return chain
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--blocks', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    blockchain = Blockchain(difficulty=1)
+
+    for length in args.blocks:
+        chain = build_chain(blockchain, length)
+
+        started = perf_counter()
+        assert blockchain.valid_chain(chain, start=1)
+        sequential = perf_counter() - started
+
+        started = perf_counter()
+        assert blockchain.valid_chain_parallel(chain, start=1, workers=args.workers)
+        parallel = perf_counter() - started
+
+        print(f'{length:>9,} blocks: sequential {sequential:.2f}s, '
+              f'parallel ({args.workers} workers) {parallel:.2f}s, speed up {sequential / parallel:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+from collections.abc import Mapping
+from hashlib import sha256
+import json
+from typing import Iterator
+
+from blkchn import encoding
+
+
+# The fields of a block, other than its transactions, that are served to peers syncing headers first
+HEADER_FIELDS = ('version', 'index', 'created_at', 'previous_hash', 'merkle_root', 'proof', 'difficulty')
+
+# Marks a field a block or transaction was created without, so that it is left out of its dictionary view
+_ABSENT = object()
+
+
+def digest(block: Mapping) -> str:
+    """Creates a SHA-256 hash of a block's fields
+
+    Versioned blocks are hashed over their canonical binary header, which covers their transactions through
+    its Merkle root. Legacy blocks, without a version, are still hashed as JSON so that existing chains
+    verify, and we must make sure that the Dictionary is Ordered, or we'll have inconsistent hashes.
+
+    Args:
+      block (Mapping): A single block on the blockchain
+
+    Returns:
+      str: A hash of the block
+
+    """
+    if block.get('version', encoding.LEGACY_VERSION) != encoding.LEGACY_VERSION:
+        return sha256(encoding.encode_header(block)).hexdigest()
+
+    if isinstance(block, Block):
+        block = block.to_dict()
+
+    block_string = json.dumps(block, sort_keys=True).encode()
+
+    return sha256(block_string).hexdigest()
+
+
+class _Record(Mapping):
+    """An immutable record with a fixed set of slotted fields and a read-only dictionary view of them.
+
+    Any fields a record is created with beyond its slotted ones are kept in `extra`, so that no data is
+    lost and the dictionary view, and therefore the hash, matches the dictionary it was created from.
+
+    """
+    __slots__ = ('extra',)
+    FIELDS = ()
+
+    def __init__(self, fields: Mapping):
+        extra = {key: value for key, value in fields.items() if key not in self.FIELDS}
+
+        for field in self.FIELDS:
+            object.__setattr__(self, field, fields.get(field, _ABSENT))
+
+        object.__setattr__(self, 'extra', extra or None)
+
+    def __setattr__(self, name, value):
+        raise TypeError(f'A {type(self).__name__.lower()} cannot be modified once it has been created.')
+
+    __delattr__ = __setattr__
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            value = getattr(self, key)
+
+            if value is not _ABSENT:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for field in self.FIELDS:
+            if getattr(self, field) is not _ABSENT:
+                yield field
+
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def to_dict(self) -> dict:
+        """Returns a plain dictionary of the record's fields, e.g. for JSON output."""
+        return dict(self.items())
+
+
+class Transaction(_Record):
+    """A transaction, which may carry any fields besides a sender, a recipient and an amount."""
+    __slots__ = ('sender', 'recipient', 'amount')
+    FIELDS = __slots__
+
+    def __reduce__(self):
+        return self.__class__, (self.to_dict(),)
+
+
+class Block(_Record):
+    """A block that has been sealed onto a chain.
+
+    A Block reads like the dictionary blocks used to be, but it cannot be modified and its hash is computed
+    once, when it is sealed. Its fields live in slots rather than a per-block dictionary, and its
+    transactions are `Transaction`s.
+
+    Attributes:
+      hash (str): The SHA-256 hash of the block's fields
+
+    """
+    __slots__ = ('version', 'index', 'created_at', 'transactions', 'proof', 'previous_hash', 'merkle_root',
+                 'difficulty', 'hash')
+    FIELDS = __slots__[:-1]
+
+    def __init__(self, fields: Mapping, hash: str = None):
+        super().__init__(fields)
+
+        if self.transactions is not _ABSENT:
+            transactions = tuple(
+                transaction if isinstance(transaction, Transaction) else Transaction(transaction)
+                for transaction in self.transactions
+            )
+            object.__setattr__(self, 'transactions', transactions)
+
+        object.__setattr__(self, 'hash', hash or digest(self))
+
+    @property
+    def header(self) -> dict:
+        """The block's header fields along with its hash."""
+        header = {field: self[field] for field in HEADER_FIELDS if field in self}
+        header['hash'] = self.hash
+
+        return header
+
+    def to_dict(self) -> dict:
+        fields = super().to_dict()
+
+        if 'transactions' in fields:
+            fields['transactions'] = [transaction.to_dict() for transaction in fields['transactions']]
+
+        return fields
+
+    def __reduce__(self):
+        return self.__class__, (self.to_dict(), self.hash)
@@ -1,8 +1,17 @@
-from hashlib import sha256
-import json
+from blkchn import encoding, merkle, mining, validation
+from blkchn.block import Block, Transaction, digest
+from blkchn.index import TransactionIndex
+from blkchn.ledger import MINT, Ledger, spending, valid_amount
+from blkchn.locks import ReadWriteLock
+from blkchn.mempool import Mempool, txid
+from blkchn.peers import Peers
+from blkchn.storage import Splice
+from functools import partial
 import logging
-import requests
+from math import log2
+from threading import Lock
 from time import time
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Tuple
 
 
 logging.basicConfig(level=logging.DEBUG)
@@ -12,16 +21,79 @@ class Blockchain:
     """A Blockchain data structure.
 
     Attributes:
-      current_transactions (list): A list of all the pending transactions
-      chain (list): A record of all the blocks within the Blockchain
+      mempool (Mempool): The pending transactions, deduplicated and bounded
+      max_block_size (int): The most bytes the encoded transactions of a new block may take up, or None for no
+        limit. Transactions that do not fit stay pending for a later block.
+      chain (list): A record of all the blocks within the Blockchain. A list unless a durable store, such as a
+        `SegmentStore`, is given as `storage`. A chain reopened from a store does not get a new genesis block.
+      positions (dict): The position of every block on our chain, by hash
+      transaction_index (TransactionIndex): Where each transaction is on our chain, by id, sender and
+        recipient. Built the first time it is used, then kept up to date as the chain changes.
+      ledger (Ledger): The balance of every address. Brought up to date with the chain when a balance is asked
+        for, then kept up to date as blocks are added and reverted.
+      reject_overspends (bool): Refuse transactions whose sender's balance, less what its pending
+        transactions already spend, does not cover them
       nodes (set): A unique collection of all connected nodes (e.g. {192.168.0.5:5000})
+      workers (int): Number of processes the Proof of Work search is spread over
+      difficulty (int): The difficulty, in leading zero bits, the chain starts at
+      block_interval (float): The number of seconds we aim to leave between blocks
+      retarget_interval (int): How many blocks pass between difficulty adjustments
+      peers (Peers): The client used to fetch chains from other nodes
+      lock (ReadWriteLock): Held to read the chain, or exclusively to change it. Locks are always taken in
+        the same order: this lock, then the mempool's, then the lock on the ledger and transaction index.
+      generation (int): Counts the reorganisations of our chain, so a reader can tell its blocks were replaced
 
     """
-    def __init__(self):
-        self.current_transactions = list()
-        self.chain = list()
+    def __init__(self, workers: int = 1, difficulty: int = mining.DEFAULT_DIFFICULTY, block_interval: float = 10,
+                 retarget_interval: int = 10, peers: Peers = None, storage: Sequence = None,
+                 mempool: Mempool = None, max_block_size: int = None, ledger: Ledger = None,
+                 reject_overspends: bool = False):
+        if retarget_interval < 2:
+            raise ValueError('The retarget interval must span at least two blocks.')
+
+        self.lock = ReadWriteLock()
+        self.sync_lock = Lock()  # Only one `resolve_conflicts` at a time
+        self.derived_lock = Lock()  # Readers bring the ledger and transaction index up to date under it
+        self.generation = 0
+        self.mempool = Mempool() if mempool is None else mempool
+        self.max_block_size = max_block_size
+        self.ledger = Ledger() if ledger is None else ledger
+        self.reject_overspends = reject_overspends
+        self.chain = list() if storage is None else storage
         self.nodes = set()
-        self.new_block(previous_hash='1', proof=100)
+        self.workers = workers
+        self.difficulty = difficulty
+        self.block_interval = block_interval
+        self.retarget_interval = retarget_interval
+        self.peers = peers or Peers()
+
+        if not self.chain:
+            self._new_block(previous_hash='1', proof=100)
+
+    @property
+    def chain(self) -> Sequence:
+        return self._chain
+
+    @chain.setter
+    def chain(self, chain: Sequence) -> None:
+        self._chain = chain
+        self.positions = {self._hash_at(position): position for position in range(len(chain))}
+        self._transaction_index = None
+
+    @property
+    def transaction_index(self) -> TransactionIndex:
+        with self.derived_lock:
+            if self._transaction_index is None:
+                self._transaction_index = TransactionIndex.build(self.chain)
+
+            return self._transaction_index
+
+    def _hash_at(self, position: int) -> str:
+        """Returns the hash of a block on our chain, which a store may know without reading the block."""
+        if hasattr(self.chain, 'hash_at'):
+            return self.chain.hash_at(position)
+
+        return self.hash(self.chain[position])
 
     def register_node(self, address: str) -> None:
         """Adds a new node to the list of nodes
@@ -34,96 +106,508 @@ class Blockchain:
 
         """
         logging.info(f'Adding `{address}` to registered nodes list.')
-        self.nodes.add(address)
 
-    def valid_chain(self, chain: dict) -> bool:
+        # The set is replaced rather than changed, so it can be iterated without holding the lock
+        with self.lock.write():
+            self.nodes = self.nodes | {address}
+
+    def valid_chain(self, chain: dict, start: int = None) -> bool:
         """Determines if a given blockchain is valid
 
+        Blocks our own, already validated, chain shares with the given chain are not checked again, so
+        the cost of validation grows with how far the chains diverge rather than with their length.
+
         Args:
           chain (dict): A list of dictionaries (blocks) making up a blockchain
+          start (int): Position of the first block to check, the blocks before it are trusted. Defaults to
+            the end of the prefix the chain shares with ours.
 
         Returns:
             bool: True if valid, False if not
 
         """
-        last_block = chain[0]
-        current_index = 1
+        if start is None:
+            start = self.shared_prefix(chain, self.hash)
+
+        return self._valid_links(chain, self.hash, start, bodies=True)
+
+    def valid_chain_parallel(self, chain: list, start: int = None, workers: int = None) -> bool:
+        """Determines if a given blockchain is valid, checking chunks of it on several processes
+
+        Gives the same answer as `valid_chain`, which remains the reference implementation. The difficulty
+        schedule and timestamps need no hashing and are checked here first, then the hash links and Proofs of
+        Work are checked in parallel.
+
+        Args:
+          chain (list): A list of dictionaries (blocks) making up a blockchain
+          start (int): Position of the first block to check, defaults to the end of the shared prefix
+          workers (int): Number of processes to use, defaults to the number of CPUs
+
+        Returns:
+            bool: True if valid, False if not
 
-        while current_index < len(chain):
-            block = chain[current_index]
-            last_block_hash = self.hash(last_block)
+        """
+        if start is None:
+            start = self.shared_prefix(chain, self.hash)
 
-            if block['previous_hash'] != last_block_hash:
-                # Check that the hash of the block is correct
-                logging.critical('Previous hash does not equal the last blocks hash!')
+        for position in range(max(start, 1), len(chain)):
+            if not self.valid_difficulty(chain, position):
+                logging.critical('The block difficulty does not follow the retargeting schedule.')
                 return False
 
-            if not self.valid_proof(last_block['proof'], block['proof'], last_block_hash):
-                # Check that the Proof of Work is correct
-                logging.critical('The last blocks hash is malformed. The blockchain is corrupt.')
+            if not self.valid_timestamp(chain, position):
+                logging.critical('The block timestamp is not after the median of recent blocks, or is in the future.')
                 return False
 
-            last_block = block
-            current_index += 1
+        return validation.check_links_parallel(chain, start, workers)
+
+    def valid_headers(self, headers: list, start: int = None) -> bool:
+        """Determines if a list of block headers forms a valid blockchain
+
+        Headers carry the hash of their block instead of its transactions, so these hashes are trusted for
+        the link and Proof of Work checks. A block's body must be checked against its header once fetched.
+
+        Args:
+          headers (list): A list of dictionaries (headers) as served by `/chain/headers`, which may be
+            preceded by blocks of our own chain
+          start (int): Position of the first header to check, the entries before it are trusted. Defaults
+            to the end of the prefix the headers share with our chain.
+
+        Returns:
+            bool: True if valid, False if not
+
+        """
+        if start is None:
+            start = self.shared_prefix(headers, self._claimed_hash)
+
+        return self._valid_links(headers, self._claimed_hash, start)
+
+    def shared_prefix(self, chain: list, hash: Callable[[dict], str] = None) -> int:
+        """Returns how many leading blocks a chain has in common with ours
+
+        Every block commits to the hash of its predecessor, so a chain that holds our block at some position
+        holds ours before it too, and the shared prefix is found by a binary search over the chain. Each step
+        looks the hash of an entry up in `positions`, so only a logarithmic number of entries are hashed, and
+        none that is the very same sealed block as ours. A chain whose later entries repeat ours over a
+        different prefix breaks its own links, and is only ever adopted from the end of the shared prefix on.
+
+        Args:
+          chain (list): A list of blocks or headers
+          hash (Callable): How to get the hash of an entry of the chain, defaults to `Blockchain.hash`
+
+        Returns:
+          int: The length of the shared prefix
+
+        """
+        hash = hash or self.hash
+        low, high = 0, min(len(chain), len(self.chain))
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if chain[middle] is self.chain[middle] or self.positions.get(hash(chain[middle])) == middle:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    @staticmethod
+    def _claimed_hash(header: dict) -> str:
+        """Returns the hash of a sealed block, or the hash a header claims for its block."""
+        return header.hash if isinstance(header, Block) else header['hash']
+
+    def _valid_links(self, chain: list, hash: Callable[[dict], str], start: int = 1,
+                     bodies: bool = False) -> bool:
+        """Checks the hash link, difficulty and Proof of Work between each block and its predecessor
+
+        When the chain is made of full blocks rather than headers, each block's transactions are also checked
+        against its Merkle root.
+
+        """
+        for position in range(max(start, 1), len(chain)):
+            if not self._valid_link(chain, position, hash, bodies):
+                return False
 
         logging.info('Success. Chain is valid.')
 
         return True
 
-    def resolve_conflicts(self) -> bool:
+    def _valid_link(self, chain: list, position: int, hash: Callable[[dict], str], bodies: bool = False) -> bool:
+        """Checks a single block of a chain against its predecessor, as `_valid_links` does for every block."""
+        block = chain[position]
+        last_block = chain[position - 1]
+        last_block_hash = hash(last_block)
+
+        if block.get('index') != position + 1:
+            # Check that the block is numbered by its position, as blocks are looked up by index
+            logging.critical(f'The block at position {position} claims index {block.get("index")}.')
+            return False
+
+        if block['previous_hash'] != last_block_hash:
+            # Check that the hash of the block is correct
+            logging.critical('Previous hash does not equal the last blocks hash!')
+            return False
+
+        if not self.valid_difficulty(chain, position):
+            # Check that the block was mined at the difficulty the retargeting schedule demands
+            logging.critical('The block difficulty does not follow the retargeting schedule.')
+            return False
+
+        if not self.valid_timestamp(chain, position):
+            # Check that the timestamps retargeting is based on move forwards, and not beyond the present
+            logging.critical('The block timestamp is not after the median of recent blocks, or is in the future.')
+            return False
+
+        difficulty = block.get('difficulty', mining.DEFAULT_DIFFICULTY)
+
+        if not self.valid_proof(last_block['proof'], block['proof'], last_block_hash, difficulty):
+            # Check that the Proof of Work is correct
+            logging.critical('The last blocks hash is malformed. The blockchain is corrupt.')
+            return False
+
+        if bodies and not self.valid_transactions(block):
+            # Check that the transactions are the ones the block's hash covers
+            logging.critical('The transactions do not match the blocks Merkle root.')
+            return False
+
+        return True
+
+    def resolve_conflicts(self, headers_first: bool = True) -> bool:
         """The consensus algorithm
 
-        Resolves conflicts by replacing the chain with the longest one in the network.
+        Resolves conflicts by replacing the chain with the one in the network that took the most work to mine,
+        rather than the one with the most blocks, which could be a long run of cheap blocks. Nodes are asked for
+        their chains in parallel, and the best valid chain received before the peers' deadline wins.
+
+        When syncing headers first, only block headers are fetched from every node. Block bodies are then
+        fetched from the node with the best chain of headers, and only from the point it forks from ours.
+
+        Nothing is locked while the peers are asked, so blocks can still be mined and the chain read. Only
+        the replacement of our chain's tail excludes readers, and only if the new chain still has more work.
+
+        Args:
+          headers_first (bool): Sync headers first, rather than downloading every node's full chain
 
         Returns:
             bool: True if our chain was replaced, False if not
 
         """
-        neighbours = self.nodes
-        new_chain = None
-        max_length = len(self.chain)  # We're only looking for chains longer than ours
-
-        # Grab and verify the chains from all the nodes in our network
-        for node in neighbours:
-            logging.info(f'Fetching chain from: {node}')
-            response = requests.get(f'http://{node}/chain')
-
-            if response.status_code == 200:
-                length = response.json()['length']
-                chain = response.json()['chain']
-
-                # Check if the length is longer and the chain is valid
-                if length > max_length and self.valid_chain(chain):
-                    max_length = length
-                    new_chain = chain
-
-        # Replace our chain if we have discovered a new, __valid chain__, longer than ours
-        if new_chain:
-            self.chain = new_chain
-            logging.warning('Replacing chain with a newer, longer, valid chain.')
-            return True
+        with self.sync_lock:
+            new_chain = self._sync_headers_first() if headers_first else self._sync_full_chains()
+
+            # Replace our chain if we have discovered a new, __valid chain__, with more work than ours
+            if new_chain:
+                with self.lock.write():
+                    # Blocks may have been mined onto our chain while the peers were asked
+                    if self.excess_work(new_chain.fork, new_chain.blocks) <= 0:
+                        return False
+
+                    self._replace_tail(new_chain.fork, new_chain.blocks)
+
+                logging.warning('Replacing chain with a valid chain with more work.')
+                return True
 
         return False
 
-    def new_block(self, proof: int, previous_hash: str) -> dict:
+    def _replace_tail(self, fork: int, blocks: list) -> None:
+        """Replaces the blocks of our chain from position `fork` onwards, keeping `positions` up to date."""
+        self.generation += 1
+
+        for position in range(fork, len(self.chain)):
+            del self.positions[self._hash_at(position)]
+
+        if self._transaction_index is not None:
+            self._transaction_index.truncate(self.chain, fork)
+
+        ledger_in_step = self._ledger_in_step()
+
+        if ledger_in_step:
+            while self.ledger.length > fork:
+                self.ledger.revert(self.chain[self.ledger.length - 1])
+
+        del self.chain[fork:]
+        self.chain.extend(blocks)
+
+        for position in range(fork, len(self.chain)):
+            self.positions[self.chain[position].hash] = position
+
+            if self._transaction_index is not None:
+                self._transaction_index.add(self.chain[position])
+
+            if ledger_in_step and self.ledger.length == position:
+                self.ledger.apply(self.chain[position])
+
+    def _sync_full_chains(self) -> Optional[Splice]:
+        """Downloads every node's blocks after the fork point and returns the valid chain with the most work."""
+        fetch = partial(self._fetch_valid_chain, locator=self.locator(), deadline=time() + self.peers.deadline)
+        new_chain = None
+        max_excess = 0  # We're only looking for chains with more work than ours
+
+        # Grab and verify the chains from all the nodes in our network, as they arrive
+        for node, chain in self.peers.gather(self.nodes, fetch):
+            if chain is not None and self.excess_work(chain.fork, chain.blocks) > max_excess:
+                logging.info(f'`{node}` has a valid chain of length {len(chain)} with more work than ours.')
+                max_excess = self.excess_work(chain.fork, chain.blocks)
+                new_chain = chain
+
+        return new_chain
+
+    def _fetch_valid_chain(self, node: str, locator: list, deadline: float = None) -> Optional[Splice]:
+        """Streams a node's blocks after the fork point, validating each one as it arrives
+
+        Only the blocks after the fork are checked. The download is abandoned as soon as a block is invalid,
+        straight away if the node's chain does not follow from ours, or once the deadline passes. The round of
+        requests has given up on the node by then, and it would otherwise keep a thread of the pool busy.
+
+        Returns:
+          Splice: The node's chain, if it is valid and has more work than ours, otherwise None
+
+        """
+        start, _, blocks = self.peers.stream_chain(node, locator, deadline)
+        fork = start - 1
+        chain = Splice(self.chain, fork, [])
+
+        try:
+            # A fork at 0 shares no genesis block with us, and nothing validates a genesis block, so its claimed
+            # work could be anything. A chain with fewer blocks than ours may still have more work, so it is read
+            # whatever its length.
+            if not 1 <= fork <= len(self.chain):
+                return None
+
+            for block in blocks:
+                if deadline is not None and time() > deadline:
+                    logging.warning(f'`{node}` was still sending blocks at the deadline, abandoning it.')
+                    return None
+
+                chain.blocks.append(block)
+
+                if len(chain) > 1 and not self._valid_link(chain, len(chain) - 1, self.hash, bodies=True):
+                    logging.critical(f'`{node}` sent an invalid block at position {len(chain) - 1}.')
+                    return None
+        finally:
+            blocks.close()
+
+        return chain if self.excess_work(fork, chain.blocks) > 0 else None
+
+    def _sync_headers_first(self) -> Optional[Splice]:
+        """Picks the best chain from every node's headers and downloads only the blocks we are missing."""
+        fetch = partial(self._fetch_valid_headers, locator=self.locator())
+        candidates = [(node, fork, headers) for node, (fork, headers) in self.peers.gather(self.nodes, fetch)
+                      if headers is not None]
+
+        # Try the candidate with the most work first, falling back to the next if its blocks don't match its headers
+        for node, fork, headers in sorted(candidates, key=lambda candidate: self.excess_work(*candidate[1:]),
+                                          reverse=True):
+            since = self.chain[fork - 1].hash
+
+            try:
+                blocks = self.peers.fetch_blocks(node, since, len(headers))[:len(headers)]
+
+                if [block.header for block in blocks] == headers and all(map(self.valid_transactions, blocks)):
+                    return Splice(self.chain, fork, blocks)
+            except Exception as error:
+                logging.warning(f'Could not fetch blocks from `{node}`: {error!r}')
+                continue
+
+            logging.critical(f'The blocks served by `{node}` do not match its headers.')
+
+        return None
+
+    def _fetch_valid_headers(self, node: str, locator: list) -> Tuple[int, Optional[list]]:
+        """Fetches a node's headers after the fork point and checks them
+
+        Runs for each node on the `Peers` pool, so that headers too malformed to check only fail their own node.
+        The headers are validated before their work is counted, as a header may claim any difficulty.
+
+        Returns:
+          tuple: The position the node's chain forks from ours and its headers after it, or None for the headers
+            if they are invalid or do not make a chain with more work than ours
+
+        """
+        start, headers = self.peers.fetch_headers(node, locator)
+        fork = start - 1
+
+        # We're only looking for chains with more work than ours, sharing our genesis block as only the headers
+        # after it are validated
+        if 1 <= fork <= len(self.chain) and self.valid_headers(Splice(self.chain, fork, headers), start=fork):
+            if self.excess_work(fork, headers) > 0:
+                logging.info(f'`{node}` has valid headers for a chain of length {fork + len(headers)}.')
+                return fork, headers
+
+        return fork, None
+
+    def locator(self) -> list:
+        """Returns a block locator for our chain
+
+        As in Bitcoin, the locator lists the hashes of the last ten blocks and then steps back exponentially
+        further, always ending with the genesis block. A node receiving it can find the last block we have in
+        common with a handful of lookups, however far our chains have diverged.
+
+        Returns:
+          list: Hashes of blocks on our chain, newest first
+
+        """
+        locator = []
+        step = 1
+
+        with self.lock.read():
+            position = len(self.chain) - 1
+
+            while position > 0:
+                locator.append(self._hash_at(position))
+
+                if len(locator) >= 10:
+                    step *= 2
+
+                position -= step
+
+            locator.append(self._hash_at(0))
+
+        return locator
+
+    def locate(self, locator: list) -> int:
+        """Finds where a chain described by a block locator forks from ours
+
+        Args:
+          locator (list): Hashes of blocks on the other chain, as returned by `locator`
+
+        Returns:
+          int: The position on our chain after the last block the chains have in common, which is 0 if
+            they do not share a genesis block
+
+        """
+        position = self.position(set(locator))
+
+        return 0 if position is None else position + 1
+
+    def position(self, hashes) -> Optional[int]:
+        """Returns the position of the newest block on our chain whose hash is in `hashes`, if any."""
+        with self.lock.read():
+            return max((self.positions[hash] for hash in hashes if hash in self.positions), default=None)
+
+    def block(self, index: int) -> Optional[Block]:
+        """Returns the block on our chain with an index, if there is one."""
+        with self.lock.read():
+            return self.chain[index - 1] if 1 <= index <= len(self.chain) else None
+
+    def block_by_hash(self, hash: str) -> Optional[Block]:
+        """Returns the block on our chain with a hash, if there is one, without scanning the chain."""
+        with self.lock.read():
+            position = self.positions.get(hash)
+
+            return None if position is None else self.chain[position]
+
+    def blocks(self, start: int = 0, stop: int = None) -> Iterator[Block]:
+        """Yields the blocks of our chain between two positions, without holding the lock between them
+
+        Each block is read under its own brief read lock, so a slow consumer, such as a peer downloading the
+        chain, never holds up new blocks. Blocks added after the first one is read are not included. If our
+        chain is reorganised meanwhile, the blocks that follow would belong to another chain, so the blocks
+        stop there.
+
+        Args:
+          start (int): Position of the first block
+          stop (int): Position just past the last block, defaults to the end of the chain
+
+        """
+        with self.lock.read():
+            generation = self.generation
+            stop = len(self.chain) if stop is None else min(stop, len(self.chain))
+
+        for position in range(start, stop):
+            with self.lock.read():
+                if self.generation != generation:
+                    logging.warning(f'Our chain was reorganised, stopping at position {position}.')
+                    return
+
+                block = self.chain[position]
+
+            yield block
+
+    @property
+    def current_transactions(self) -> list:
+        """A list of all the pending transactions, in order of arrival."""
+        return list(self.mempool)
+
+    def new_block(self, proof: int, previous_hash: str, reward: dict = None) -> Block:
         """Creates a new Block on the Blockchain
 
+        The block holds the best paying pending transactions that fit within `max_block_size`, highest fee per
+        byte first, and the rest stay pending. They are taken from the mempool while the chain is locked, so
+        a transaction submitted meanwhile is either in the block or still pending, never lost.
+
         Args:
           proof: The proof given by the Proof of Work algorithm
           previous_hash: Hash of previous Block
+          reward: The mining reward transaction, which goes in last and never waits in the mempool
+
+        Returns:
+          Block: New Block, sealed with its hash
+
+        """
+        with self.lock.write():
+            return self._new_block(proof, previous_hash, reward)
+
+    def extend_tip(self, proof: int, last_hash: str, reward: dict = None) -> Optional[Block]:
+        """Creates a new Block on the Blockchain, but only on top of the block a proof was found for
+
+        Checking the tip and adding the block happen under the same lock, so a block is never added to a chain
+        that was replaced after its proof was found.
+
+        Args:
+          proof: The proof given by the Proof of Work algorithm
+          last_hash: Hash of the block the proof was found for
+          reward: The mining reward transaction, as for `new_block`
 
         Returns:
-          dict: New Block
+          Block: New Block, sealed with its hash, or None if `last_hash` is no longer the tip of our chain
 
         """
-        self.current_transactions = list()  # Reset the current list of transactions
-        self.chain.append({
+        with self.lock.write():
+            if self._hash_at(len(self.chain) - 1) != last_hash:
+                return None
+
+            return self._new_block(proof, last_hash, reward)
+
+    def _new_block(self, proof: int, previous_hash: str, reward: dict = None) -> Block:
+        space = self.max_block_size
+
+        if reward is not None:
+            reward = Transaction(reward)
+
+            if space is not None:
+                space = max(space - len(encoding.encode_transaction(reward)), 0)
+
+        transactions = self.mempool.select(space)
+
+        # A block must be created after the median time of the blocks before it, which a fast miner can outrun
+        created_at = int(time())
+        median = mining.median_time(self.chain, len(self.chain))
+
+        if created_at <= median:
+            created_at = int(median) + 1
+
+        if reward is not None:
+            transactions.append(reward)
+
+        self.chain.append(Block({
+            'version': encoding.BLOCK_VERSION,
             'index': len(self.chain) + 1,
-            'created_at': time(),
-            'transactions': self.current_transactions,
+            'created_at': created_at,
+            'transactions': transactions,
             'proof': proof,
             'previous_hash': previous_hash or self.hash(self.chain[-1]),
-        })
+            'difficulty': self.next_difficulty(),
+            'merkle_root': merkle.root(transactions),
+        }))
+        self.positions[self.chain[-1].hash] = len(self.chain) - 1
+
+        if self._transaction_index is not None:
+            self._transaction_index.add(self.chain[-1])
+
+        if self.ledger.length == len(self.chain) - 1 and self._ledger_in_step():
+            self.ledger.apply(self.chain[-1])
 
         logging.info('Success. New block created.')
 
@@ -132,7 +616,9 @@ class Blockchain:
     def new_transaction(self, transaction: dict) -> int:
         """Creates a new transaction to go into the next mined block
 
-        The dictionary passed in can contain any data
+        The dictionary passed in can contain any data, and may offer a `fee`. Submitting a transaction that is
+        already pending has no effect. Only mined blocks may mint coins, so a transaction from the mint (sender
+        `0`) is refused; a block's reward is given to `new_block` instead.
 
         Args:
           transaction (dict): A dictionary representation of a transaction
@@ -150,24 +636,165 @@ class Blockchain:
         Returns:
           int: The index of the block that will hold this transaction
 
+        Raises:
+          ValueError: If the transaction's fee or amount is invalid, it is sent by the mint, or it overspends and
+            `reject_overspends` is set
+          MempoolFull: If the mempool is full and the transaction cannot displace any other
+
+        """
+        # A read lock is enough, as the mempool has its own lock, but no block may be mined meanwhile
+        with self.lock.read():
+            added = self.mempool.add(Transaction(transaction), self._admit)
+            index = len(self.chain) + 1
+
+        if added:
+            logging.info('Success. New transaction created.')
+        else:
+            logging.info('The transaction is already pending.')
+
+        return index
+
+    def new_transactions(self, transactions: Iterable[dict]) -> list:
+        """Creates a batch of new transactions to go into the next mined blocks
+
+        The whole batch is added to the mempool in one locked operation. A transaction that cannot be added
+        does not stop the rest of the batch.
+
+        Args:
+          transactions (Iterable): Dictionary representations of transactions, as for `new_transaction`
+
+        Returns:
+          list: For each transaction, its id and the outcome of adding it, as returned by `Mempool.add_many`
+
+        """
+        with self.lock.read():
+            results = self.mempool.add_many(transactions, self._admit)
+
+        logging.info(f'Success. {sum(outcome is True for _, outcome in results)} new transactions created.')
+
+        return results
+
+    def _ledger_in_step(self) -> bool:
+        """Returns whether the ledger has applied a prefix of our chain, rather than blocks we no longer have."""
+        length = self.ledger.length
+
+        return length <= len(self.chain) and (length == 0 or self._hash_at(length - 1) == self.ledger.tip)
+
+    def balance(self, address: str) -> float:
+        """Returns the balance of an address on our chain
+
+        The ledger is first brought up to date, applying only the blocks it has not yet seen, or rebuilt if it
+        was left on blocks that are no longer on our chain.
+
+        """
+        with self.lock.read():
+            return self._balance(address)
+
+    def _balance(self, address: str) -> float:
+        with self.derived_lock:
+            if not self._ledger_in_step():
+                logging.warning('The ledger does not match our chain, rebuilding it.')
+                self.ledger.reset()
+
+            for position in range(self.ledger.length, len(self.chain)):
+                self.ledger.apply(self.chain[position])
+
+            return self.ledger.balance(address)
+
+    def _admit(self, transaction: dict) -> None:
+        """Refuses a transaction that may not wait in the mempool
+
+        A transaction may not mint coins, nor move a negative amount, which would take coins from its recipient,
+        nor a NaN or infinite one, which would poison the pending spending of its sender. If we check, it may not
+        overspend either.
+
+        """
+        if transaction.get('sender') == MINT:
+            raise ValueError('Only mined blocks may mint coins.')
+
+        if not valid_amount(transaction):
+            raise ValueError('The amount must be a finite, non-negative number.')
+
+        if self.reject_overspends:
+            self._check_balance(transaction)
+
+    def _check_balance(self, transaction: dict) -> None:
+        """Refuses a transaction its sender cannot afford, counting what its pending transactions spend."""
+        amount = spending(transaction)
+
+        if not amount:
+            return
+
+        sender = transaction['sender']
+
+        if self._balance(sender) - self.mempool.spending.get(sender, 0) < amount:
+            raise ValueError(f'`{sender}` cannot afford to send {amount}.')
+
+    def find_transaction(self, key: str) -> Optional[dict]:
+        """Finds a transaction by id, on our chain or waiting in the mempool
+
+        Args:
+          key (str): The id of the transaction, the SHA-256 hash of its canonical encoding
+
+        Returns:
+          dict: The transaction and, if it has been mined, the indexes of the blocks holding it, or None if
+            there is no such transaction
+
         """
-        self.current_transactions.append(transaction)
+        with self.lock.read():
+            locations = self.transaction_index.locate(key)
 
-        logging.info('Success. New transaction created.')
+            if locations:
+                block_position, slot = locations[0]
 
-        return self.last_block['index'] + 1
+                return {
+                    'id': key,
+                    'transaction': self.chain[block_position]['transactions'][slot].to_dict(),
+                    'blocks': [position + 1 for position, _ in locations],
+                    'pending': key in self.mempool,
+                }
+
+        pending = self.mempool.get(key)
+
+        return None if pending is None else {'id': key, 'transaction': pending.to_dict(), 'blocks': [],
+                                             'pending': True}
+
+    def address_transactions(self, address: str, role: str = None, offset: int = 0, limit: int = None) -> list:
+        """Returns a page of the mined transactions an address sent or received, oldest first
+
+        Args:
+          address (str): The address
+          role (str): `sender` or `recipient` to only include transactions the address sent or received
+          offset (int): How many of the matching transactions to skip
+          limit (int): The most transactions to return, or None for all of them
+
+        Returns:
+          list: Dictionaries of each transaction's id, the index of its block and the transaction itself
+
+        Raises:
+          ValueError: If the role is not recognised
+
+        """
+        page = []
+
+        with self.lock.read():
+            for position, slot in self.transaction_index.involving(address, role, offset, limit):
+                transaction = self.chain[position]['transactions'][slot]
+                page.append({'id': txid(transaction), 'block': position + 1, 'transaction': transaction.to_dict()})
+
+        return page
 
     @property
     def last_block(self) -> dict:
         """Returns the last block on the blockchain."""
-
-        return self.chain[-1]
+        with self.lock.read():
+            return self.chain[-1]
 
     @staticmethod
     def hash(block: dict) -> str:
         """Creates a SHA-256 hash of a Block
 
-        We must make sure that the Dictionary is Ordered, or we'll have inconsistent hashes
+        Sealed blocks carry the hash they were sealed with, so it is only computed for plain dictionaries.
 
         Args:
           block (dict): A single block on the blockchain
@@ -176,42 +803,169 @@ class Blockchain:
           str: A hash of the block
 
         """
-        block_string = json.dumps(block, sort_keys=True).encode()
+        if isinstance(block, Block):
+            return block.hash
 
-        return sha256(block_string).hexdigest()
+        return digest(block)
 
-    def proof_of_work(self, last_block) -> int:
+    def proof_of_work(self, last_block, stop: Callable[[], bool] = None) -> Optional[int]:
         """Proof of Work Algorithm
 
         Repeatedly hashes incrementing the nonce value until the hash has N zeros at the beginning.
+        The previous block is only hashed once, rather than once per nonce. When the Blockchain has
+        more than one worker, the search is spread over a process pool instead.
 
         Args:
           last_block (dict): The last block to have been placed on the blockchain
+          stop (Callable): Polled during the search, which is abandoned when it returns True
+
+        Returns:
+          int: The proof of work, or None if the search was stopped
+
+        """
+        last_hash = self.hash(last_block)
+
+        with self.lock.read():
+            difficulty = self.next_difficulty()
+
+        if self.workers > 1:
+            return mining.search(last_block['proof'], last_hash, difficulty, self.workers, stop)
+
+        return mining.scan(last_block['proof'], last_hash, difficulty, stop=stop)
+
+    def next_difficulty(self) -> int:
+        """Returns the difficulty the next block on our chain must be mined at."""
+
+        return self.expected_difficulty(self.chain, len(self.chain))
+
+    def expected_difficulty(self, chain: list, position: int) -> int:
+        """Retargeting rule for the difficulty of the block at a given position in a chain
+
+        Every `retarget_interval` blocks, the spacing of the `created_at` times of the preceding
+        `retarget_interval` blocks is compared with `block_interval`. The difficulty moves by the number of
+        bits that would bring the spacing back to `block_interval`, by at most two bits in either direction.
+        Between retargets, a block inherits the difficulty of its predecessor.
+
+        Args:
+          chain (list): The chain the block belongs to
+          position (int): Position of the block in the chain, which may be one past the end
+
+        Returns:
+          int: The difficulty in leading zero bits
+
+        """
+        if position == 0:
+            return self.difficulty
+
+        previous = chain[position - 1].get('difficulty', mining.DEFAULT_DIFFICULTY)
+
+        if position < self.retarget_interval or position % self.retarget_interval:
+            return previous
+
+        first = chain[position - self.retarget_interval]
+        last = chain[position - 1]
+        elapsed = max(last['created_at'] - first['created_at'], 1e-3)
+        expected = self.block_interval * (self.retarget_interval - 1)
+        adjustment = max(-2, min(2, round(log2(expected / elapsed))))
+
+        return max(mining.MIN_DIFFICULTY, min(mining.MAX_DIFFICULTY, previous + adjustment))
+
+    def valid_difficulty(self, chain: list, position: int) -> bool:
+        """Checks that a block was mined at the difficulty the retargeting schedule demands
+
+        Blocks created before difficulty was recorded carry none, but once the chain has reached its first
+        retarget every block must, so a block cannot skip the schedule by leaving it out.
+
+        """
+        block = chain[position]
+
+        if 'difficulty' not in block and position < self.retarget_interval:
+            return True
+
+        return block.get('difficulty') == self.expected_difficulty(chain, position)
+
+    @staticmethod
+    def valid_timestamp(chain: list, position: int) -> bool:
+        """Checks that a block was created after the median time of the blocks before it, and not in the future
+
+        Args:
+          chain (list): The chain the block belongs to
+          position (int): Position of the block in the chain
 
         Returns:
-          int: The proof of work
+          bool: True if the block's `created_at` is valid, False if not
 
         """
-        proof = 0
+        created_at = chain[position]['created_at']
 
-        while not self.valid_proof(last_proof=last_block['proof'], proof=proof, last_hash=self.hash(last_block)):
-            proof += 1
+        return mining.median_time(chain, position) < created_at <= time() + mining.MAX_FUTURE_DRIFT
 
-        return proof
+    @staticmethod
+    def work(blocks: Iterable[dict]) -> int:
+        """Returns the total work of blocks or headers, the number of hashes their Proofs of Work take on average."""
+        return sum(mining.work(block.get('difficulty', mining.DEFAULT_DIFFICULTY)) for block in blocks)
+
+    def excess_work(self, fork: int, blocks: list) -> int:
+        """Returns how much more work a chain has than ours, when it is our first `fork` blocks then `blocks`
+
+        The blocks must have been validated from `fork` onwards, so `fork` must be at least 1: the genesis block
+        has no predecessor to check its difficulty against.
+
+        """
+        return self.work(blocks) - self.work(self.chain[fork:])
+
+    @staticmethod
+    def valid_transactions(block: dict) -> bool:
+        """Checks that a block's transactions match its Merkle root, for blocks that have one."""
+        return 'merkle_root' not in block or merkle.root(block['transactions']) == block['merkle_root']
+
+    def merkle_proof(self, index: int, position: int) -> dict:
+        """Returns a proof that a transaction is included in a block
+
+        The proof can be checked with `merkle.verify` against the Merkle root in the block's header, so a
+        light client only needs the headers of the chain rather than its blocks.
+
+        Args:
+          index (int): The index of the block holding the transaction
+          position (int): The position of the transaction within the block
+
+        Returns:
+          dict: The transaction, the block's Merkle root, and the path of sibling hashes between them
+
+        Raises:
+          IndexError: If there is no such block or transaction
+          ValueError: If the block predates Merkle roots
+
+        """
+        block = self.block(index)
+
+        if block is None:
+            raise IndexError('block index out of range')
+
+        if 'merkle_root' not in block:
+            raise ValueError(f'Block {index} has no Merkle root.')
+
+        return {
+            'index': index,
+            'position': position,
+            'transaction': block['transactions'][position].to_dict(),
+            'merkle_root': block['merkle_root'],
+            'proof': merkle.proof(block['transactions'], position),
+        }
 
     @staticmethod
-    def valid_proof(last_proof: int, proof: int, last_hash: str) -> bool:
+    def valid_proof(last_proof: int, proof: int, last_hash: str,
+                    difficulty: int = mining.DEFAULT_DIFFICULTY) -> bool:
         """Validates the Proof
 
         Args:
           last_proof (int): Previous Proof
           proof (int): Current Proof
           last_hash (int): The hash of the Previous Block
+          difficulty (int): Leading zero bits the hash of the guess must have
 
         Returns:
           bool: True if correct, False if not.
 
         """
-        guess = f'{last_proof}{proof}{last_hash}'.encode()
-
-        return sha256(guess).hexdigest()[:4] == '0000'
+        return mining.valid_proof(last_proof, proof, last_hash, difficulty)
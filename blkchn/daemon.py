@@ -0,0 +1,157 @@
+import logging
+from threading import Event, Thread
+from time import time
+from typing import Callable, Optional
+
+from blkchn import mining
+
+
+logging.basicConfig(level=logging.DEBUG)
+
+
+class BlockTemplate:
+    """What the next block will be built on, prepared before the search for its proof starts.
+
+    A proof only covers the previous block's proof and hash, not the new block's transactions, so a template
+    whose transactions are out of date can be swapped for a fresh one without losing the search. Only a new
+    tip means the search has to start again.
+
+    Attributes:
+      index (int): The index of the block being mined
+      last_hash (str): The hash of the tip of the chain the block goes on top of
+      last_proof (int): The proof of that tip
+      difficulty (int): The difficulty the block must be mined at
+      reward (dict): The reward transaction that goes in the block
+      mempool_version (int): The version of the mempool the template was prepared from
+      pending (int): How many transactions were waiting when the template was prepared
+      created_at (float): When the template was prepared
+
+    """
+    def __init__(self, blockchain, last_block, reward: dict):
+        self.index = last_block['index'] + 1
+        self.last_hash = blockchain.hash(last_block)
+        self.last_proof = last_block['proof']
+
+        # The difficulty is that of the block after `last_block`, which the tip may already have moved past
+        with blockchain.lock.read():
+            self.difficulty = blockchain.expected_difficulty(blockchain.chain, last_block['index'])
+
+        self.reward = reward
+        self.mempool_version = blockchain.mempool.version
+        self.pending = len(blockchain.mempool)
+        self.created_at = time()
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class Miner:
+    """Mines blocks continuously on a background thread, rather than only when asked to.
+
+    The miner keeps a block template for the tip of the chain and searches for its proof without pause. When
+    the mempool changes the template is refreshed while the search carries on, and when the tip changes, e.g.
+    because `resolve_conflicts` replaced the chain, the search starts again on the new tip. The transactions
+    of a block are taken from the mempool as it is sealed, so they are always the best ones pending.
+
+    The proof is searched for from the template. When the Blockchain has more than one worker, the search runs
+    on a `mining.Searcher` whose processes are started with the miner and kept for as long as it runs.
+
+    Attributes:
+      blockchain (Blockchain): The chain blocks are mined onto
+      reward (Callable): Returns the reward transaction for a new block
+      template (BlockTemplate): The template the miner is working on
+      last_block (Block): The tip the search in progress started from, which every template of the search is
+        built on
+      blocks (int): How many blocks the miner has forged
+      restarts (int): How many searches were abandoned because the tip changed
+      refreshes (int): How many times the template was refreshed without restarting the search
+      searcher (Searcher): The pool of processes searching for proofs, or None to search on the miner's thread
+
+    """
+    def __init__(self, blockchain, reward: Callable[[], dict]):
+        self.blockchain = blockchain
+        self.reward = reward
+        self.template: Optional[BlockTemplate] = None
+        self.last_block = None
+        self.blocks = 0
+        self.restarts = 0
+        self.refreshes = 0
+        self.searcher: Optional[mining.Searcher] = None
+        self.stopped = Event()
+        self.thread = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> None:
+        """Starts mining, if the miner is not running already."""
+        if not self.running:
+            self.stopped.clear()
+            self.thread = Thread(target=self._run, name='miner', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stops mining, waiting for the search in progress to be abandoned."""
+        self.stopped.set()
+
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def status(self) -> dict:
+        return {
+            'running': self.running,
+            'blocks': self.blocks,
+            'restarts': self.restarts,
+            'refreshes': self.refreshes,
+            'template': None if self.template is None else self.template.to_dict(),
+        }
+
+    def _run(self) -> None:
+        if self.blockchain.workers > 1:
+            self.searcher = mining.Searcher(self.blockchain.workers).start()
+
+        try:
+            while not self.stopped.is_set():
+                try:
+                    self._mine_one()
+                except Exception:
+                    logging.exception('The miner failed, retrying on the current tip.')
+                    self.stopped.wait(1)
+        finally:
+            if self.searcher is not None:
+                self.searcher.close()
+                self.searcher = None
+
+    def _stale(self) -> bool:
+        """Polled during the search. Refreshes an out of date template, and stops the search on a new tip."""
+        blockchain = self.blockchain
+
+        if self.stopped.is_set() or blockchain.last_block.hash != self.last_block.hash:
+            return True
+
+        # The tip may move at any moment, so the template is built on the block the search started from
+        if blockchain.mempool.version != self.template.mempool_version:
+            self.template = BlockTemplate(blockchain, self.last_block, self.template.reward)
+            self.refreshes += 1
+
+        return False
+
+    def _mine_one(self) -> None:
+        """Searches for a proof on the current tip, and seals a block with it if the tip has not moved."""
+        blockchain = self.blockchain
+        last_block = self.last_block = blockchain.last_block
+        template = self.template = BlockTemplate(blockchain, last_block, self.reward())
+
+        if self.searcher is not None:
+            proof = self.searcher.search(template.last_proof, template.last_hash, template.difficulty, self._stale)
+        else:
+            proof = mining.scan(template.last_proof, template.last_hash, template.difficulty, stop=self._stale)
+
+        block = None if proof is None else blockchain.extend_tip(proof, last_block.hash, self.template.reward)
+
+        if block is not None:
+            self.blocks += 1
+            logging.info(f'The miner forged block {block["index"]}.')
+        elif not self.stopped.is_set():
+            self.restarts += 1
@@ -0,0 +1,284 @@
+from collections.abc import Mapping
+import struct
+from typing import Iterable, Iterator, Tuple
+
+
+# Blocks without a version are hashed as sorted JSON. Version 2 blocks are hashed over their binary header.
+LEGACY_VERSION = 1
+BLOCK_VERSION = 2
+
+# The fixed width part of a version 2 block: version, index, created_at, proof and difficulty
+BLOCK_HEADER = struct.Struct('>BQqQH')
+BLOCK_FIELDS = ('version', 'index', 'created_at', 'proof', 'difficulty', 'previous_hash', 'merkle_root',
+                'transactions')
+
+# The most bytes a single block may take up when a chain is read from a peer
+MAX_RECORD_SIZE = 32 * 1024 * 1024
+
+_U32 = struct.Struct('>I')
+_I64 = struct.Struct('>q')
+_F64 = struct.Struct('>d')
+
+# Type tags for the canonical encoding of JSON-like values
+_NONE, _FALSE, _TRUE, _INT, _BIG_INT, _FLOAT, _STR, _LIST, _MAP = range(9)
+
+
+def _encode_bytes(data: bytes, out: bytearray) -> None:
+    out += _U32.pack(len(data))
+    out += data
+
+
+def _decode_bytes(data: bytes, offset: int) -> Tuple[bytes, int]:
+    length, = _U32.unpack_from(data, offset)
+    offset += _U32.size
+
+    if offset + length > len(data):
+        raise ValueError('Encoded data is truncated.')
+
+    return bytes(data[offset:offset + length]), offset + length
+
+
+def encode_value(value, out: bytearray) -> None:
+    """Appends the canonical encoding of a JSON-like value
+
+    Integers are fixed width unless they do not fit in 64 bits, strings are length prefixed UTF-8 and
+    mappings are written with their keys sorted, so equal values always encode to the same bytes.
+
+    Args:
+      value: None, a bool, int, float or str, or a list, tuple or mapping of these
+      out (bytearray): The buffer to append to
+
+    """
+    if value is None:
+        out.append(_NONE)
+    elif value is True or value is False:
+        out.append(_TRUE if value else _FALSE)
+    elif isinstance(value, int):
+        if -2 ** 63 <= value < 2 ** 63:
+            out.append(_INT)
+            out += _I64.pack(value)
+        else:
+            out.append(_BIG_INT)
+            _encode_bytes(value.to_bytes(value.bit_length() // 8 + 1, 'big', signed=True), out)
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _F64.pack(value)
+    elif isinstance(value, str):
+        out.append(_STR)
+        _encode_bytes(value.encode(), out)
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        out += _U32.pack(len(value))
+
+        for item in value:
+            encode_value(item, out)
+    elif isinstance(value, Mapping):
+        out.append(_MAP)
+        out += _U32.pack(len(value))
+
+        for key in sorted(value):
+            if not isinstance(key, str):
+                raise ValueError('Only string keys can be encoded.')
+
+            _encode_bytes(key.encode(), out)
+            encode_value(value[key], out)
+    else:
+        raise ValueError(f'Values of type {type(value).__name__} cannot be encoded.')
+
+
+def decode_value(data: bytes, offset: int = 0) -> Tuple[object, int]:
+    """Decodes a value written by `encode_value`, returning it and the offset just past it."""
+    tag = data[offset]
+    offset += 1
+
+    if tag == _NONE:
+        return None, offset
+    if tag in (_FALSE, _TRUE):
+        return tag == _TRUE, offset
+    if tag == _INT:
+        return _I64.unpack_from(data, offset)[0], offset + _I64.size
+    if tag == _BIG_INT:
+        raw, offset = _decode_bytes(data, offset)
+        return int.from_bytes(raw, 'big', signed=True), offset
+    if tag == _FLOAT:
+        return _F64.unpack_from(data, offset)[0], offset + _F64.size
+    if tag == _STR:
+        raw, offset = _decode_bytes(data, offset)
+        return raw.decode(), offset
+    if tag == _LIST:
+        count, = _U32.unpack_from(data, offset)
+        offset += _U32.size
+        items = []
+
+        for _ in range(count):
+            item, offset = decode_value(data, offset)
+            items.append(item)
+
+        return items, offset
+    if tag == _MAP:
+        count, = _U32.unpack_from(data, offset)
+        offset += _U32.size
+        items = {}
+
+        for _ in range(count):
+            key, offset = _decode_bytes(data, offset)
+            items[key.decode()], offset = decode_value(data, offset)
+
+        return items, offset
+
+    raise ValueError(f'Unknown type tag {tag}.')
+
+
+def encode_transaction(transaction: Mapping) -> bytes:
+    """Returns the canonical encoding of a transaction, a mapping of its fields sorted by name."""
+    out = bytearray()
+    encode_value(transaction, out)
+
+    return bytes(out)
+
+
+def encode_header(block: Mapping) -> bytes:
+    """Returns the canonical binary encoding of a version 2 block's header, which is what its hash covers
+
+    The header is the block's fixed width fields (version, index, created_at as whole seconds, proof and
+    difficulty), followed by its length prefixed previous hash and Merkle root, and finally a mapping of any
+    fields other than its transactions. The transactions are covered through the Merkle root.
+
+    Raises:
+      ValueError: If the header cannot be encoded, e.g. because `created_at` is fractional
+
+    """
+    out = bytearray()
+
+    try:
+        out += BLOCK_HEADER.pack(block['version'], block['index'], block['created_at'], block['proof'],
+                                 block['difficulty'])
+        _encode_bytes(block['previous_hash'].encode(), out)
+        _encode_bytes(bytes.fromhex(block['merkle_root']), out)
+    except (struct.error, KeyError, AttributeError, TypeError) as error:
+        raise ValueError(f'The block cannot be encoded: {error}')
+
+    encode_value({key: value for key, value in block.items() if key not in BLOCK_FIELDS}, out)
+
+    return bytes(out)
+
+
+def encode_block(block: Mapping) -> bytes:
+    """Returns the canonical binary encoding of a block
+
+    A version 2 block is its header, as encoded by `encode_header`, followed by its transactions as a count
+    and then each length prefixed transaction. A legacy block, without a version, is a version byte followed
+    by the encoding of all of its fields as a mapping, so that it can be stored and sent without loss, though
+    it is still hashed as JSON.
+
+    Args:
+      block (Mapping): A single block on the blockchain
+
+    Returns:
+      bytes: The encoded block
+
+    Raises:
+      ValueError: If the block cannot be encoded, e.g. a version 2 block with a fractional `created_at`
+
+    """
+    version = block.get('version', LEGACY_VERSION)
+    out = bytearray()
+
+    if version == LEGACY_VERSION:
+        out.append(LEGACY_VERSION)
+        encode_value(block, out)
+        return bytes(out)
+
+    out += encode_header(block)
+
+    try:
+        out += _U32.pack(len(block['transactions']))
+
+        for transaction in block['transactions']:
+            _encode_bytes(encode_transaction(transaction), out)
+    except (KeyError, TypeError) as error:
+        raise ValueError(f'The block cannot be encoded: {error}')
+
+    return bytes(out)
+
+
+def decode_block(data: bytes) -> dict:
+    """Decodes a block written by `encode_block` into a dictionary of its fields."""
+    if data[0] == LEGACY_VERSION:
+        return decode_value(data, 1)[0]
+
+    version, index, created_at, proof, difficulty = BLOCK_HEADER.unpack_from(data)
+    previous_hash, offset = _decode_bytes(data, BLOCK_HEADER.size)
+    merkle_root, offset = _decode_bytes(data, offset)
+    extra, offset = decode_value(data, offset)
+    count, = _U32.unpack_from(data, offset)
+    offset += _U32.size
+    transactions = []
+
+    for _ in range(count):
+        transaction, offset = _decode_bytes(data, offset)
+        transactions.append(decode_value(transaction)[0])
+
+    return dict(extra, version=version, index=index, created_at=created_at, proof=proof, difficulty=difficulty,
+                previous_hash=previous_hash.decode(), merkle_root=merkle_root.hex(), transactions=transactions)
+
+
+def encode_chain(blocks: Iterable[Mapping]) -> Iterator[bytes]:
+    """Encodes blocks for transfer to a peer, each as a length prefixed record."""
+    for block in blocks:
+        encoded = encode_block(block)
+        yield _U32.pack(len(encoded)) + encoded
+
+
+def decode_chain(data: bytes) -> Iterator[dict]:
+    """Decodes the blocks in data written by `encode_chain`."""
+    return read_chain([data])
+
+
+def read_chain(chunks: Iterable[bytes], max_record_size: int = MAX_RECORD_SIZE) -> Iterator[dict]:
+    """Decodes blocks written by `encode_chain` as they arrive, e.g. from a streamed response
+
+    Each block is yielded as soon as its record is complete, so only the block being received is buffered,
+    however the data is split into chunks. The length of each record is checked before it is buffered, so a
+    peer cannot make us hold gigabytes by declaring a block that large.
+
+    Args:
+      chunks (Iterable): The data, in chunks of any size
+      max_record_size (int): The most bytes a single block's record may declare
+
+    Yields:
+      dict: Each block's fields, as decoded by `decode_block`
+
+    Raises:
+      ValueError: If the data is malformed, declares a block larger than `max_record_size` or ends part way
+        through a block
+
+    """
+    buffer = bytearray()
+
+    try:
+        for chunk in chunks:
+            buffer += chunk
+            offset = 0
+
+            while len(buffer) - offset >= _U32.size:
+                length, = _U32.unpack_from(buffer, offset)
+
+                if length > max_record_size:
+                    raise ValueError(f'Malformed block data: a block of {length} bytes exceeds the limit of '
+                                     f'{max_record_size}.')
+
+                end = offset + _U32.size + length
+
+                if end > len(buffer):
+                    break
+
+                yield decode_block(bytes(buffer[offset + _U32.size:end]))
+                offset = end
+
+            del buffer[:offset]
+    except (struct.error, IndexError) as error:
+        raise ValueError(f'Malformed block data: {error}')
+
+    if buffer:
+        raise ValueError('Malformed block data: it ends part way through a block.')
@@ -0,0 +1,119 @@
+from collections.abc import Mapping, Sequence
+from heapq import merge
+from itertools import islice
+from typing import Dict, List, Tuple
+
+from blkchn.mempool import txid
+
+
+# Where a transaction sits: the position of its block on the chain and its position within the block
+Location = Tuple[int, int]
+
+
+class TransactionIndex:
+    """Secondary indexes over the transactions on a chain, by id, by sender and by recipient.
+
+    Every list of locations is kept in chain order, so blocks are added to the end of the index and a
+    reorganisation only has to pop the locations of the blocks it removes from the ends of the lists.
+
+    Attributes:
+      ids (dict): The locations of the transactions with each id. Identical transactions, such as the
+        rewards of a node mining several blocks, share an id.
+      senders (dict): The locations of the transactions sent by each address
+      recipients (dict): The locations of the transactions received by each address
+      length (int): How many blocks of the chain have been indexed
+
+    """
+    def __init__(self):
+        self.ids: Dict[str, List[Location]] = dict()
+        self.senders: Dict[str, List[Location]] = dict()
+        self.recipients: Dict[str, List[Location]] = dict()
+        self.length = 0
+
+    @classmethod
+    def build(cls, chain: Sequence) -> 'TransactionIndex':
+        """Returns an index of every transaction on a chain."""
+        index = cls()
+
+        for block in chain:
+            index.add(block)
+
+        return index
+
+    def add(self, block: Mapping) -> None:
+        """Indexes the transactions of the block that follows the last one indexed."""
+        position = self.length
+
+        for slot, transaction in enumerate(block.get('transactions', ())):
+            location = (position, slot)
+            self.ids.setdefault(txid(transaction), []).append(location)
+
+            for addresses, field in ((self.senders, 'sender'), (self.recipients, 'recipient')):
+                address = transaction.get(field)
+
+                if isinstance(address, str):
+                    addresses.setdefault(address, []).append(location)
+
+        self.length += 1
+
+    def truncate(self, chain: Sequence, position: int) -> None:
+        """Removes the transactions of the blocks from `position` onwards, which are read from `chain`."""
+        while self.length > position:
+            self.length -= 1
+
+            for transaction in reversed(chain[self.length].get('transactions', ())):
+                self._pop(self.ids, txid(transaction))
+
+                for addresses, field in ((self.senders, 'sender'), (self.recipients, 'recipient')):
+                    if isinstance(transaction.get(field), str):
+                        self._pop(addresses, transaction[field])
+
+    @staticmethod
+    def _pop(index: dict, key: str) -> None:
+        locations = index[key]
+        locations.pop()
+
+        if not locations:
+            del index[key]
+
+    def locate(self, key: str) -> List[Location]:
+        """Returns the locations of the transactions with an id, oldest first."""
+        return list(self.ids.get(key, ()))
+
+    def involving(self, address: str, role: str = None, offset: int = 0, limit: int = None) -> List[Location]:
+        """Returns a page of the locations of the transactions an address sent or received, oldest first
+
+        Args:
+          address (str): The address
+          role (str): `sender` or `recipient` to only include transactions the address sent or received
+          offset (int): How many of the matching transactions to skip
+          limit (int): The most locations to return, or None for all of them
+
+        Returns:
+          list: The locations
+
+        Raises:
+          ValueError: If the role is not recognised
+
+        """
+        if role == 'sender':
+            locations = iter(self.senders.get(address, ()))
+        elif role == 'recipient':
+            locations = iter(self.recipients.get(address, ()))
+        elif role is None:
+            # A transaction an address sends to itself is in both lists, but should only be listed once
+            both = merge(self.senders.get(address, ()), self.recipients.get(address, ()))
+            locations = (location for location, previous in _with_previous(both) if location != previous)
+        else:
+            raise ValueError(f'Unknown role `{role}`.')
+
+        return list(islice(locations, offset, None if limit is None else offset + limit))
+
+
+def _with_previous(items):
+    """Yields each item with the one before it, which is None for the first."""
+    previous = None
+
+    for item in items:
+        yield item, previous
+        previous = item
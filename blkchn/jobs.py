@@ -0,0 +1,144 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from threading import Event, Lock
+from time import time
+from typing import Callable, Optional
+from uuid import uuid4
+
+
+logging.basicConfig(level=logging.DEBUG)
+
+# Job states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+
+class MiningJob:
+    """A request to mine a block, which is carried out in the background.
+
+    Attributes:
+      id (str): Identifies the job
+      status (str): `pending`, `running`, `done`, `cancelled` or `failed`
+      created_at (float): When the job was submitted
+      restarts (int): How many times the search started again because the tip of the chain changed
+      block (Block): The block the job forged, once it is done
+      error (str): Why the job failed, if it did
+
+    """
+    def __init__(self):
+        self.id = uuid4().hex
+        self.status = PENDING
+        self.created_at = time()
+        self.restarts = 0
+        self.block = None
+        self.error = None
+        self.cancelled = Event()
+
+    def to_dict(self) -> dict:
+        job = {'id': self.id, 'status': self.status, 'created_at': self.created_at, 'restarts': self.restarts}
+
+        if self.block is not None:
+            job['block'] = dict(self.block.to_dict(), hash=self.block.hash)
+
+        if self.error is not None:
+            job['error'] = self.error
+
+        return job
+
+
+class MiningJobs:
+    """Runs mining jobs one at a time on a background thread, so that requests are not held up by the search.
+
+    While a job searches for a proof, the search is stopped as soon as the job is cancelled or the tip of the
+    chain changes, e.g. because `resolve_conflicts` replaced the chain. In the latter case the job starts
+    again on top of the new tip, so it never forges a block onto a chain we no longer have.
+
+    Attributes:
+      blockchain (Blockchain): The chain blocks are mined onto
+      reward (Callable): Returns the reward transaction for a new block
+      keep (int): How many jobs are remembered, the oldest finished ones are forgotten first
+      jobs (OrderedDict): The jobs by id, in order of submission
+
+    """
+    def __init__(self, blockchain, reward: Callable[[], dict], keep: int = 1000):
+        self.blockchain = blockchain
+        self.reward = reward
+        self.keep = keep
+        self.jobs = OrderedDict()
+        self.lock = Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mining')
+
+    def submit(self) -> MiningJob:
+        """Queues a new job to mine a block, and returns it straight away."""
+        job = MiningJob()
+
+        with self.lock:
+            self.jobs[job.id] = job
+            self._forget_finished()
+
+        self.executor.submit(self._run, job)
+
+        return job
+
+    def get(self, job_id: str) -> Optional[MiningJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[MiningJob]:
+        """Cancels a job that has not finished, returning it, or None if there is no such job."""
+        job = self.jobs.get(job_id)
+
+        if job is not None and job.status in (PENDING, RUNNING):
+            job.cancelled.set()
+
+            if job.status == PENDING:
+                job.status = CANCELLED
+
+        return job
+
+    def _forget_finished(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.status not in (PENDING, RUNNING)]
+
+        for job_id in finished[:max(len(self.jobs) - self.keep, 0)]:
+            del self.jobs[job_id]
+
+    def _run(self, job: MiningJob) -> None:
+        if job.cancelled.is_set():
+            return
+
+        job.status = RUNNING
+
+        try:
+            job.block = self._mine(job)
+            job.status = DONE if job.block is not None else CANCELLED
+        except Exception as error:
+            logging.exception(f'Mining job `{job.id}` failed.')
+            job.error = str(error)
+            job.status = FAILED
+
+    def _mine(self, job: MiningJob):
+        """Searches for a proof on top of the current tip, starting again whenever the tip changes."""
+        blockchain = self.blockchain
+
+        while not job.cancelled.is_set():
+            last_block = blockchain.last_block
+            last_hash = blockchain.hash(last_block)
+
+            def stop() -> bool:
+                return job.cancelled.is_set() or blockchain.last_block.hash != last_hash
+
+            proof = blockchain.proof_of_work(last_block, stop=stop)
+            block = None if proof is None else blockchain.extend_tip(proof, last_hash, self.reward())
+
+            if block is not None:
+                logging.info(f'Mining job `{job.id}` found a proof.')
+                return block
+
+            if not job.cancelled.is_set():
+                logging.info(f'The tip of the chain changed, restarting mining job `{job.id}`.')
+                job.restarts += 1
+
+        return None
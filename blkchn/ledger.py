@@ -0,0 +1,148 @@
+from collections.abc import Mapping
+import json
+import logging
+from math import isfinite
+import os
+from typing import Optional
+
+from blkchn.block import Block, digest
+
+
+logging.basicConfig(level=logging.DEBUG)
+
+# The sender of mining rewards, which mints coins rather than spending them
+MINT = '0'
+
+
+def _amount(transaction: Mapping) -> Optional[float]:
+    """Returns the amount a transaction moves, or None if it does not move a numeric amount."""
+    amount = transaction.get('amount')
+
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        return None
+
+    return amount
+
+
+def valid_amount(transaction: Mapping) -> bool:
+    """Returns whether a transaction moves a finite, non-negative amount, or no numeric amount at all."""
+    amount = _amount(transaction)
+
+    return amount is None or (isfinite(amount) and amount >= 0)
+
+
+def spending(transaction: Mapping) -> float:
+    """Returns how much a transaction takes from its sender's balance, which is nothing for the mint."""
+    amount = _amount(transaction)
+
+    if amount is None or transaction.get('sender') == MINT or not isinstance(transaction.get('sender'), str):
+        return 0
+
+    return amount
+
+
+class Ledger:
+    """The balance of every address, kept up to date block by block rather than computed from the chain.
+
+    Each transaction with a numeric `amount` moves it from its `sender` to its `recipient`, except that the
+    mint (sender `0`) creates the coins it sends. Applying a block and reverting it are exact opposites, so a
+    reorganisation reverts the blocks it removes and applies the ones that replace them.
+
+    The ledger can be snapshotted to a JSON file, recording the hash of the last block it has applied, so a
+    restarted node only applies the blocks after that one.
+
+    Attributes:
+      balances (dict): The balance of every address that has sent or received a numeric amount
+      length (int): How many blocks of the chain have been applied
+      tip (str): The hash of the last block applied, or None
+      path (str): Where the ledger is snapshotted, or None to keep it in memory only
+      snapshot_every (int): How many blocks are applied between snapshots
+
+    """
+    def __init__(self, path: str = None, snapshot_every: int = 100):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.unsaved = 0
+        self.reset()
+
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def reset(self) -> None:
+        """Forgets every balance, so that the chain is applied again from its genesis block."""
+        self.balances = dict()
+        self.length = 0
+        self.tip = None
+
+    def balance(self, address: str) -> float:
+        return self.balances.get(address, 0)
+
+    def apply(self, block: Mapping) -> None:
+        """Applies the transactions of the block that follows the last one applied."""
+        for transaction in block.get('transactions', ()):
+            self._move(transaction, 1)
+
+        self.length += 1
+        self.tip = block.hash if isinstance(block, Block) else digest(block)
+        self._changed()
+
+    def revert(self, block: Mapping) -> None:
+        """Reverts the transactions of the last block applied, which must be `block`."""
+        for transaction in reversed(block.get('transactions', ())):
+            self._move(transaction, -1)
+
+        self.length -= 1
+        self.tip = block['previous_hash'] if self.length else None
+        self._changed()
+
+    def _move(self, transaction: Mapping, direction: int) -> None:
+        amount = _amount(transaction)
+
+        if amount is None:
+            return
+
+        taken = spending(transaction)
+
+        if taken:
+            self._credit(transaction['sender'], -taken * direction)
+
+        if isinstance(transaction.get('recipient'), str):
+            self._credit(transaction['recipient'], amount * direction)
+
+    def _credit(self, address: str, amount: float) -> None:
+        balance = self.balances.get(address, 0) + amount
+
+        # Drop addresses that are back to nothing, so reverting a block leaves no trace of it
+        if balance:
+            self.balances[address] = balance
+        else:
+            self.balances.pop(address, None)
+
+    def _changed(self) -> None:
+        self.unsaved += 1
+
+        if self.path is not None and self.unsaved >= self.snapshot_every:
+            self.save()
+
+    def save(self) -> None:
+        """Writes a snapshot of the ledger, replacing the previous one atomically."""
+        temporary = f'{self.path}.tmp'
+
+        with open(temporary, 'w') as snapshot:
+            json.dump({'length': self.length, 'tip': self.tip, 'balances': self.balances}, snapshot)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+
+        os.replace(temporary, self.path)
+        self.unsaved = 0
+
+    def load(self) -> None:
+        """Reads the snapshot of the ledger, starting again from nothing if it cannot be read."""
+        try:
+            with open(self.path) as snapshot:
+                state = json.load(snapshot)
+
+            self.balances, self.length, self.tip = dict(state['balances']), int(state['length']), state['tip']
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logging.warning(f'Could not read the ledger snapshot `{self.path}`, it will be rebuilt: {error}')
+            self.reset()
@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+from threading import Condition, Lock
+from typing import Iterator
+
+
+class ReadWriteLock:
+    """A lock that any number of readers can hold at once, or a single writer.
+
+    Readers and writers take turns: once a writer is waiting, new readers wait behind it, so a steady stream of
+    reads cannot starve writes, and when a writer releases the lock every reader that was waiting for it goes in
+    before the next writer, so a steady stream of writes cannot starve reads either. The lock is not reentrant,
+    so a thread holding it must not try to take it again.
+
+    Usage:
+
+      with lock.read():
+          ...
+
+      with lock.write():
+          ...
+
+    """
+    def __init__(self):
+        self._condition = Condition(Lock())
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+        self._waiting_readers = 0
+        self._phase = 0  # Counts the writes released
+        self._due = 0  # Readers that waited for the last write, which go in before the next one
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._condition:
+            phase = self._phase
+            self._waiting_readers += 1
+
+            try:
+                while self._writing or (self._waiting_writers and self._phase == phase):
+                    self._condition.wait()
+            finally:
+                self._waiting_readers -= 1
+
+                # A reader that waited for a write was counted as due when it was released, whether it goes in
+                # or gives up, and the writers waiting behind the last due reader may now go in
+                if self._phase != phase:
+                    self._due -= 1
+
+                    if not self._due and not self._readers:
+                        self._condition.notify_all()
+
+            self._readers += 1
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._condition:
+            self._waiting_writers += 1
+
+            try:
+                while self._writing or self._readers or self._due:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+
+            self._writing = True
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._phase += 1
+                self._due = self._waiting_readers
+                self._condition.notify_all()
@@ -0,0 +1,358 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+from hashlib import sha256
+import heapq
+from itertools import count
+import logging
+from math import isfinite
+from threading import RLock
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from blkchn import encoding
+from blkchn.block import Transaction
+from blkchn.ledger import spending
+
+
+logging.basicConfig(level=logging.DEBUG)
+
+# Eviction policies, used when a new transaction does not fit in a full mempool
+OLDEST = 'oldest'
+LOWEST_FEE = 'lowest_fee'
+
+# Block assembly gives up after this many transactions in a row that do not fit in what is left of a block
+MAX_SKIPPED = 100
+
+
+class MempoolFull(Exception):
+    """Raised when a transaction cannot be admitted to a full mempool."""
+
+
+def fee(transaction: Mapping) -> float:
+    """Returns the fee a transaction offers, which is 0 for transactions without one
+
+    Raises:
+      ValueError: If the fee is not a finite, non-negative number
+
+    """
+    value = transaction.get('fee', 0)
+
+    # NaN compares false with everything, so it would pass the sign check and break the ordering of the heaps
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not isfinite(value) or value < 0:
+        raise ValueError('The fee must be a finite, non-negative number.')
+
+    return value
+
+
+def txid(transaction: Mapping) -> str:
+    """Returns the id of a transaction, the SHA-256 hash of its canonical encoding."""
+    return sha256(encoding.encode_transaction(transaction)).hexdigest()
+
+
+class Mempool:
+    """The transactions waiting to be mined, keyed by a hash of their content.
+
+    Submitting a transaction that is already pending has no effect. The pool can be bounded by a number of
+    transactions and by the total size of their encodings. When a new transaction does not fit, the `oldest`
+    policy evicts the longest waiting transactions, and the `lowest_fee` policy evicts those paying the least
+    per byte, as long as they pay less than the new transaction does.
+
+    Transactions are also kept in a heap ordered by fee per byte, so that `select` can fill a block with the
+    best paying of them without sorting the whole pool.
+
+    Every change to the pool holds `lock`, so it can be shared between request threads.
+
+    Attributes:
+      max_count (int): The most transactions that may be pending, or None for no limit
+      max_bytes (int): The most bytes the pending transactions may take up encoded, or None for no limit
+      eviction (str): The eviction policy, `oldest` or `lowest_fee`
+      bytes (int): The encoded size of the pending transactions
+      spending (dict): The total amount the pending transactions of each sender take from its balance
+      version (int): Counts changes to the pool, so a block template can tell when it is out of date
+      lock (RLock): Held while the pool is changed
+
+    """
+    def __init__(self, max_count: int = None, max_bytes: int = None, eviction: str = OLDEST):
+        if eviction not in (OLDEST, LOWEST_FEE):
+            raise ValueError(f'Unknown eviction policy `{eviction}`.')
+
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.bytes = 0
+        self.transactions = OrderedDict()  # txid -> Transaction, in order of arrival
+        self.sizes = dict()  # txid -> encoded size
+        self.arrived = dict()  # txid -> arrival, which tells a transaction's heap entries from stale ones
+        self.best = []  # A heap of (-fee per byte, arrival, txid)
+        self.cheapest = []  # A heap of (fee per byte, arrival, txid), only kept for the `lowest_fee` policy
+        self.arrivals = count()
+        self.spending = dict()
+        self.version = 0
+        self.lock = RLock()
+
+    def __len__(self) -> int:
+        return len(self.transactions)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.transactions
+
+    def __iter__(self) -> Iterator[Transaction]:
+        with self.lock:
+            return iter(list(self.transactions.values()))
+
+    def get(self, key: str) -> Optional[Transaction]:
+        """Returns the pending transaction with an id, or None if there is none."""
+        return self.transactions.get(key)
+
+    def add(self, transaction: Mapping, check: Callable[[Mapping], None] = None) -> bool:
+        """Adds a transaction to the pool, evicting others if it is full
+
+        Args:
+          transaction (Mapping): The transaction to add
+          check (Callable): Called with the transaction while the lock is held, before it is added, to refuse
+            it by raising a ValueError
+
+        Returns:
+          bool: True if the transaction was added, False if it was already pending
+
+        Raises:
+          ValueError: If the transaction's fee is invalid, or `check` refuses it
+          MempoolFull: If the transaction cannot be made to fit
+
+        """
+        encoded = encoding.encode_transaction(transaction)
+
+        with self.lock:
+            return self._add(transaction, encoded, sha256(encoded).hexdigest(), check)
+
+    def add_many(self, transactions: Iterable[Mapping],
+                 check: Callable[[Mapping], None] = None) -> List[Tuple[Optional[str], Union[bool, Exception]]]:
+        """Adds a batch of transactions while holding the lock once, rather than once per transaction
+
+        A transaction that cannot be added does not stop the rest of the batch.
+
+        Args:
+          transactions (Iterable): The transactions to add, in order
+          check (Callable): As for `add`, called for each transaction in turn
+
+        Returns:
+          list: For each transaction, its id (None if it could not be encoded) and either the result `add`
+            would have returned, or the ValueError or MempoolFull it would have raised
+
+        """
+        results = []
+
+        with self.lock:
+            for transaction in transactions:
+                try:
+                    encoded = encoding.encode_transaction(transaction)
+                except ValueError as error:
+                    results.append((None, error))
+                    continue
+
+                key = sha256(encoded).hexdigest()
+
+                try:
+                    results.append((key, self._add(transaction, encoded, key, check)))
+                except (ValueError, MempoolFull) as error:
+                    results.append((key, error))
+
+        return results
+
+    def _add(self, transaction: Mapping, encoded: bytes, key: str, check: Callable[[Mapping], None]) -> bool:
+        if key in self.transactions:
+            return False
+
+        if check is not None:
+            check(transaction)
+
+        size = len(encoded)
+        rate = fee(transaction) / size
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise MempoolFull(f'The transaction is larger than the mempool ({size} > {self.max_bytes} bytes).')
+
+        self._make_room(size, rate)
+
+        if not isinstance(transaction, Transaction):
+            transaction = Transaction(transaction)
+
+        arrival = next(self.arrivals)
+        self.transactions[key] = transaction
+        self.sizes[key] = size
+        self.arrived[key] = arrival
+        self.bytes += size
+        self.version += 1
+        self._spend(transaction, 1)
+        heapq.heappush(self.best, (-rate, arrival, key))
+
+        if self.eviction == LOWEST_FEE:
+            heapq.heappush(self.cheapest, (rate, arrival, key))
+
+        return True
+
+    def _full(self, size: int, removed: int = 0, freed: int = 0) -> bool:
+        """Returns whether a transaction of `size` bytes would take the pool over either of its limits
+
+        Args:
+          size (int): The encoded size of the new transaction
+          removed (int): How many pending transactions are to be evicted first
+          freed (int): How many bytes evicting them frees
+
+        """
+        return ((self.max_count is not None and len(self.transactions) - removed >= self.max_count) or
+                (self.max_bytes is not None and self.bytes - freed + size > self.max_bytes))
+
+    def _make_room(self, size: int, rate: float) -> None:
+        """Evicts transactions until one of `size` bytes paying `rate` per byte fits."""
+        if not self._full(size):
+            return
+
+        if self.eviction == OLDEST:
+            while self._full(size):
+                self._evict(next(iter(self.transactions)))
+
+            return
+
+        # Only evict once we know enough cheaper transactions can go, so a rejection leaves the pool untouched
+        victims = []
+        freed = 0
+
+        while self._full(size, len(victims), freed):
+            entry = self._pop_cheapest()
+
+            if entry is None or entry[0] >= rate:
+                if entry is not None:
+                    heapq.heappush(self.cheapest, entry)
+
+                for victim in victims:
+                    heapq.heappush(self.cheapest, victim)
+
+                raise MempoolFull('The mempool is full of transactions paying a higher fee.')
+
+            victims.append(entry)
+            freed += self.sizes[entry[2]]
+
+        for _, _, key in victims:
+            self._evict(key)
+
+    def _pop_cheapest(self) -> Optional[tuple]:
+        """Pops the heap entry of the pending transaction paying the least per byte."""
+        return self._pop(self.cheapest)
+
+    def _pop(self, heap: list) -> Optional[tuple]:
+        """Pops the first entry of a heap that belongs to a pending transaction, discarding stale ones."""
+        while heap:
+            entry = heapq.heappop(heap)
+
+            if self.arrived.get(entry[2]) == entry[1]:
+                return entry
+
+        return None
+
+    def _prune(self, heap: list) -> list:
+        """Returns a heap without the entries of transactions that are no longer pending."""
+        heap = [entry for entry in heap if self.arrived.get(entry[2]) == entry[1]]
+        heapq.heapify(heap)
+
+        return heap
+
+    def _evict(self, key: str) -> None:
+        logging.info(f'Evicting transaction `{key}` from the mempool.')
+        self._remove(key)
+
+    def remove(self, key: str) -> Optional[Transaction]:
+        """Removes a pending transaction by id, returning it, or None if it was not pending."""
+        with self.lock:
+            return self._remove(key)
+
+    def _remove(self, key: str) -> Optional[Transaction]:
+        transaction = self.transactions.pop(key, None)
+
+        if transaction is not None:
+            self.bytes -= self.sizes.pop(key)
+            self.version += 1
+            del self.arrived[key]
+            self._spend(transaction, -1)
+
+            # Entries of removed transactions are skipped when popped, but don't let them pile up
+            if len(self.best) > 2 * len(self.transactions) + 64:
+                self.best = self._prune(self.best)
+                self.cheapest = self._prune(self.cheapest)
+
+        return transaction
+
+    def select(self, max_bytes: int = None) -> List[Transaction]:
+        """Removes and returns the best paying transactions that fit in a block
+
+        Transactions are taken in order of fee per byte, and in order of arrival when they pay the same. One
+        that does not fit in what is left of the block is passed over for smaller ones behind it, until
+        `MAX_SKIPPED` in a row have not fitted. Taking k transactions costs O(k log n).
+
+        Args:
+          max_bytes (int): The most bytes the encoded transactions may take up, or None for no limit
+
+        Returns:
+          list: The transactions for the block, best paying first
+
+        """
+        with self.lock:
+            if max_bytes is None or max_bytes >= self.bytes:
+                # Everything fits, so there is nothing to gain from popping the heap one transaction at a time
+                order = sorted(entry for entry in self.best if self.arrived.get(entry[2]) == entry[1])
+                transactions = self.transactions
+                self.drain()
+                return [transactions[key] for _, _, key in order]
+
+            selected = []
+            skipped = []
+            misses = 0
+            space = max_bytes
+
+            while misses < MAX_SKIPPED:
+                entry = self._pop(self.best)
+
+                if entry is None:
+                    break
+
+                key = entry[2]
+
+                if self.sizes[key] > space:
+                    skipped.append(entry)
+                    misses += 1
+                    continue
+
+                space -= self.sizes[key]
+                selected.append(self._remove(key))
+                misses = 0
+
+            for entry in skipped:
+                heapq.heappush(self.best, entry)
+
+            return selected
+
+    def drain(self) -> List[Transaction]:
+        """Removes and returns every pending transaction, in order of arrival."""
+        with self.lock:
+            transactions = list(self.transactions.values())
+            self.transactions = OrderedDict()
+            self.sizes = dict()
+            self.arrived = dict()
+            self.best = []
+            self.cheapest = []
+            self.bytes = 0
+            self.spending = dict()
+            self.version += 1
+
+        return transactions
+
+    def _spend(self, transaction: Mapping, direction: int) -> None:
+        """Adds a transaction to, or with a direction of -1 removes it from, its sender's pending spending."""
+        amount = spending(transaction)
+
+        if amount:
+            total = self.spending.get(transaction['sender'], 0) + amount * direction
+
+            if total:
+                self.spending[transaction['sender']] = total
+            else:
+                del self.spending[transaction['sender']]
@@ -0,0 +1,96 @@
+from collections.abc import Mapping
+from hashlib import sha256
+from typing import List, Sequence
+
+from blkchn import encoding
+
+
+# Leaves and interior nodes are hashed with different prefixes, so that one can never pass for the other
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+# The root of a block without transactions
+EMPTY_ROOT = bytes(32)
+
+
+def leaf(transaction: Mapping) -> bytes:
+    """Returns the hash of a transaction as a leaf of the tree."""
+    return sha256(LEAF_PREFIX + encoding.encode_transaction(transaction)).digest()
+
+
+def _parent(left: bytes, right: bytes) -> bytes:
+    return sha256(NODE_PREFIX + left + right).digest()
+
+
+def _next_level(level: List[bytes]) -> List[bytes]:
+    """Pairs up a level of the tree. An odd node out is promoted unchanged rather than paired with itself."""
+    parents = [_parent(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+
+    if len(level) % 2:
+        parents.append(level[-1])
+
+    return parents
+
+
+def root(transactions: Sequence[Mapping]) -> str:
+    """Returns the hex Merkle root of a list of transactions
+
+    Args:
+      transactions (Sequence): The transactions of a block, in order
+
+    Returns:
+      str: The hex digest of the root of the tree
+
+    """
+    level = [leaf(transaction) for transaction in transactions]
+
+    if not level:
+        return EMPTY_ROOT.hex()
+
+    while len(level) > 1:
+        level = _next_level(level)
+
+    return level[0].hex()
+
+
+def proof(transactions: Sequence[Mapping], position: int) -> list:
+    """Returns an inclusion proof for the transaction at `position`
+
+    The proof is the list of sibling hashes on the path from the transaction's leaf to the root, each
+    marked with the side it sits on. It holds at most log2(n) hashes for n transactions.
+
+    Args:
+      transactions (Sequence): The transactions of a block, in order
+      position (int): Position of the transaction to prove
+
+    Returns:
+      list: Dictionaries of `side` ('left' or 'right') and `hash`, from the leaf upwards
+
+    """
+    if not 0 <= position < len(transactions):
+        raise IndexError('transaction index out of range')
+
+    level = [leaf(transaction) for transaction in transactions]
+    path = []
+
+    while len(level) > 1:
+        sibling = position ^ 1
+
+        if sibling < len(level):
+            path.append({'side': 'left' if sibling < position else 'right', 'hash': level[sibling].hex()})
+
+        level = _next_level(level)
+        position //= 2
+
+    return path
+
+
+def verify(transaction: Mapping, path: list, merkle_root: str) -> bool:
+    """Checks an inclusion proof from `proof` against a Merkle root taken from a block header."""
+    node = leaf(transaction)
+
+    for step in path:
+        sibling = bytes.fromhex(step['hash'])
+        node = _parent(sibling, node) if step['side'] == 'left' else _parent(node, sibling)
+
+    return node.hex() == merkle_root
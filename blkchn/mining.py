@@ -0,0 +1,224 @@
+from hashlib import sha256
+from multiprocessing import Process, Queue, Value
+import logging
+import os
+from queue import Empty
+from typing import Callable, Optional
+
+
+logging.basicConfig(level=logging.DEBUG)
+
+# How many nonces are tried between checks of the stop condition
+BATCH_SIZE = 4096
+
+# Difficulty is the number of leading zero bits a proof's hash must have. 16 bits is the original rule of
+# four leading hex zeros, and is what blocks created before difficulty was recorded are checked against.
+DEFAULT_DIFFICULTY = 16
+MIN_DIFFICULTY = 1
+MAX_DIFFICULTY = 255
+
+# A block must be created after the median time of this many blocks before it, and no further than this many
+# seconds in the future, so that the timestamps retargeting is based on cannot be stretched at will
+MEDIAN_TIME_SPAN = 11
+MAX_FUTURE_DRIFT = 2 * 60 * 60
+
+
+def target(difficulty: int) -> int:
+    """Returns the value a proof's hash, read as a big endian integer, must be strictly below."""
+    return 1 << (256 - difficulty)
+
+
+def work(difficulty: int) -> int:
+    """Returns the number of hashes a proof at a difficulty takes on average."""
+    return 1 << difficulty
+
+
+def median_time(chain, position: int) -> float:
+    """Returns the median `created_at` of the `MEDIAN_TIME_SPAN` blocks before a position
+
+    A block at the position must be created after it. Nothing precedes the genesis block, so its median is minus
+    infinity.
+
+    """
+    times = sorted(chain[previous]['created_at'] for previous in range(max(position - MEDIAN_TIME_SPAN, 0), position))
+
+    return times[len(times) // 2] if times else float('-inf')
+
+
+def meets_target(digest: bytes, difficulty: int) -> bool:
+    """Checks a raw SHA-256 digest against a difficulty, without formatting it as hex."""
+    return int.from_bytes(digest, 'big') < target(difficulty)
+
+
+def valid_proof(last_proof: int, proof: int, last_hash: str, difficulty: int = DEFAULT_DIFFICULTY) -> bool:
+    """Checks whether the guess `f'{last_proof}{proof}{last_hash}'` hashes below the difficulty's target."""
+    guess = f'{last_proof}{proof}{last_hash}'.encode()
+
+    return meets_target(sha256(guess).digest(), difficulty)
+
+
+def scan(last_proof: int, last_hash: str, difficulty: int = DEFAULT_DIFFICULTY, start: int = 0, step: int = 1,
+         stop: Callable[[], bool] = None) -> Optional[int]:
+    """Searches nonces start, start + step, start + 2 * step, ... for a valid proof
+
+    A guess is `f'{last_proof}{proof}{last_hash}'`, so the `last_proof` prefix is hashed once up front and
+    each nonce only copies that midstate and feeds in the nonce followed by the fixed length hash of the
+    previous block. The cost per nonce is therefore independent of the size of the previous block.
+
+    Args:
+      last_proof (int): The proof of the previous block
+      last_hash (str): The hash of the previous block
+      difficulty (int): Leading zero bits the hash of the guess must have
+      start (int): The first nonce to try
+      step (int): The distance between consecutive nonces
+      stop (Callable): Polled every `BATCH_SIZE` nonces, the search is abandoned when it returns True
+
+    Returns:
+      int: The proof of work, or None if the search was stopped
+
+    """
+    prefix = sha256(str(last_proof).encode())
+    suffix = last_hash.encode()
+    bound = target(difficulty)
+    proof = start
+
+    while stop is None or not stop():
+        for _ in range(BATCH_SIZE):
+            guess = prefix.copy()
+            guess.update(b'%d%s' % (proof, suffix))
+
+            if int.from_bytes(guess.digest(), 'big') < bound:
+                return proof
+
+            proof += step
+
+    return None
+
+
+def _worker(tasks: Queue, current: Value, results: Queue, start: int, step: int) -> None:
+    """Runs in a child process, scanning its share of the nonces for each search it is sent until told to exit."""
+    while True:
+        task = tasks.get()
+
+        if task is None:
+            return
+
+        search_id, last_proof, last_hash, difficulty = task
+
+        # A search superseded while the task was queued is skipped rather than scanned
+        proof = scan(last_proof, last_hash, difficulty, start, step, stop=lambda: current.value != search_id)
+
+        if proof is not None:
+            results.put((search_id, proof))
+
+
+class Searcher:
+    """A pool of long-lived processes that search for proofs, one search at a time
+
+    The processes are started once and each search is sent to them over a queue, so a miner moving from tip to
+    tip does not start a new pool for every block. The nonce space is partitioned by striding: worker `n` of
+    `N` tries nonces n, n + N, n + 2N, ... Every search has an id, and the workers abandon a search as soon as
+    the current id moves on, whether because a proof was found or because the search was stopped.
+
+    Attributes:
+      workers (int): Number of processes the search is spread over
+
+    """
+    def __init__(self, workers: int = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.current = Value('q', 0)
+        self.results = Queue()
+        self.tasks = [Queue() for _ in range(self.workers)]
+        self.processes = [
+            Process(target=_worker, args=(tasks, self.current, self.results, start, self.workers), daemon=True)
+            for start, tasks in enumerate(self.tasks)
+        ]
+
+    def start(self) -> 'Searcher':
+        for process in self.processes:
+            process.start()
+
+        return self
+
+    def close(self) -> None:
+        """Abandons any search in progress and waits for the processes to exit."""
+        self._cancel()
+
+        for tasks in self.tasks:
+            tasks.put(None)
+
+        for process in self.processes:
+            process.join()
+
+    def _cancel(self) -> int:
+        with self.current.get_lock():
+            self.current.value += 1
+
+            return self.current.value
+
+    def search(self, last_proof: int, last_hash: str, difficulty: int = DEFAULT_DIFFICULTY,
+               stop: Callable[[], bool] = None) -> Optional[int]:
+        """Searches for a proof across the pool's processes
+
+        Args:
+          last_proof (int): The proof of the previous block
+          last_hash (str): The hash of the previous block
+          difficulty (int): Leading zero bits the hash of the guess must have
+          stop (Callable): Polled while the workers search, the search is abandoned when it returns True
+
+        Returns:
+          int: The proof of work, or None if the search was stopped
+
+        """
+        search_id = self._cancel()
+
+        for tasks in self.tasks:
+            tasks.put((search_id, last_proof, last_hash, difficulty))
+
+        try:
+            while True:
+                try:
+                    found, proof = self.results.get(timeout=0.1)
+                except Empty:
+                    if stop is not None and stop():
+                        return None
+
+                    if not any(process.is_alive() for process in self.processes):
+                        raise RuntimeError('All proof of work workers exited without finding a proof.')
+
+                    continue
+
+                # Proofs from an earlier search may still be queued, and are of no use to this one
+                if found == search_id:
+                    break
+        finally:
+            self._cancel()
+
+        logging.info(f'Found proof {proof} using {self.workers} workers.')
+
+        return proof
+
+
+def search(last_proof: int, last_hash: str, difficulty: int = DEFAULT_DIFFICULTY, workers: int = None,
+           stop: Callable[[], bool] = None) -> Optional[int]:
+    """Searches for a proof across a pool of processes that is started for this one search
+
+    Callers that search repeatedly, like the continuous miner, should keep a `Searcher` instead.
+
+    Args:
+      last_proof (int): The proof of the previous block
+      last_hash (str): The hash of the previous block
+      difficulty (int): Leading zero bits the hash of the guess must have
+      workers (int): Number of processes to use, defaults to the number of CPUs
+      stop (Callable): Polled while the workers search, the search is abandoned when it returns True
+
+    Returns:
+      int: The proof of work, or None if the search was stopped
+
+    """
+    searcher = Searcher(workers).start()
+
+    try:
+        return searcher.search(last_proof, last_hash, difficulty, stop)
+    finally:
+        searcher.close()
@@ -0,0 +1,254 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+import logging
+from time import time
+from typing import Callable, Iterable, Iterator, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from blkchn import encoding
+from blkchn.block import Block
+
+
+logging.basicConfig(level=logging.DEBUG)
+
+# Blocks are requested in their binary encoding, which nodes serve with this content type
+BINARY = 'application/octet-stream'
+
+# How many bytes of a streamed response are read at a time
+CHUNK_SIZE = 64 * 1024
+
+
+def read_chunks(response: requests.Response, deadline: float = None) -> Iterator[bytes]:
+    """Reads a streamed response as its data arrives, giving up once the deadline passes
+
+    Each read returns whatever has been received, up to `CHUNK_SIZE` bytes, rather than waiting for a full
+    chunk, so a node that trickles its data out is caught at the deadline and not a whole chunk later.
+
+    Args:
+      response (requests.Response): A response made with `stream=True`
+      deadline (float): The time after which to give up, or None to read until the end
+
+    Yields:
+      bytes: The data, in chunks of up to `CHUNK_SIZE` bytes
+
+    Raises:
+      requests.Timeout: If the deadline passes before the response ends
+
+    """
+    while True:
+        if deadline is not None and time() > deadline:
+            raise requests.Timeout('The deadline passed while the response was still arriving.')
+
+        chunk = response.raw.read1(CHUNK_SIZE, decode_content=True)
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def stream_blocks(response: requests.Response, deadline: float = None) -> Tuple[int, int, Iterator[Block]]:
+    """Reads the blocks from a `/chain` response as they arrive, in either the binary encoding or JSON
+
+    Binary responses are decoded block by block as they are received, so the response is never held in
+    memory as a whole, nor read past the deadline. JSON responses, from nodes that do not serve the binary
+    encoding, are parsed whole. The blocks are sealed as they are read, which hashes each of them exactly once.
+
+    Args:
+      response (requests.Response): A response made with `stream=True`
+      deadline (float): The time after which to stop reading binary responses, or None for no limit
+
+    Returns:
+      tuple: The index of the first block sent, the length of the node's chain and an iterator over the
+        sealed blocks
+
+    """
+    if response.headers.get('Content-Type', '').startswith(BINARY):
+        start = int(response.headers.get('X-Chain-Start', 1))
+        blocks = encoding.read_chain(read_chunks(response, deadline))
+        length = int(response.headers.get('X-Chain-Length', 0))
+    else:
+        payload = response.json()
+        start = payload.get('start', 1)
+        blocks = payload['chain']
+        length = payload.get('length', start - 1 + len(blocks))
+
+    return start, length, (Block(block) for block in blocks)
+
+
+def parse_blocks(response: requests.Response) -> Tuple[int, list]:
+    """Reads the blocks from a `/chain` response, in either the binary encoding or JSON
+
+    Returns:
+      tuple: The index of the first block sent and the list of sealed blocks
+
+    """
+    start, _, blocks = stream_blocks(response)
+
+    return start, list(blocks)
+
+
+class Peers:
+    """A pooled HTTP client for talking to the other nodes in the network.
+
+    Requests to different nodes are made in parallel on a thread pool that shares one `requests.Session`,
+    so connections to a node are kept alive between consensus rounds.
+
+    Attributes:
+      connect_timeout (float): Seconds to wait for a connection to a single node
+      read_timeout (float): Seconds to wait between bytes received from a single node
+      deadline (float): Seconds a whole round of requests may take, after which slower nodes are ignored
+      session (requests.Session): The session shared by every request
+
+    """
+    def __init__(self, connect_timeout: float = 3.05, read_timeout: float = 10, deadline: float = 30,
+                 max_workers: int = 16):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers))
+        self.session.mount('https://', HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='peers')
+
+    def get(self, node: str, path: str, **kwargs) -> requests.Response:
+        """Makes a GET request to a node, within the per-node timeouts
+
+        Args:
+          node (str): Address of a node. E.g. '192.168.0.5:5000'
+          path (str): The path to request, e.g. '/chain'
+
+        Returns:
+          requests.Response: The response, which has not been checked for errors
+
+        """
+        return self.session.get(f'http://{node}{path}', timeout=(self.connect_timeout, self.read_timeout), **kwargs)
+
+    def gather(self, nodes: Iterable[str], fetch: Callable[[str], object]) -> Iterator[Tuple[str, object]]:
+        """Runs `fetch` against every node in parallel and yields results as they arrive
+
+        Nodes whose request fails, or whose response `fetch` cannot make sense of, are logged and skipped, so a
+        single misbehaving node cannot fail the round. Once the deadline passes, any nodes still outstanding are
+        abandoned, so a single slow node cannot hold up the caller either.
+
+        Args:
+          nodes (Iterable): The addresses of the nodes to contact
+          fetch (Callable): Takes a node address and returns its result
+
+        Yields:
+          tuple: The address of a node and the value `fetch` returned for it
+
+        """
+        futures = {self.executor.submit(fetch, node): node for node in nodes}
+
+        try:
+            for future in as_completed(futures, timeout=self.deadline):
+                node = futures[future]
+
+                try:
+                    yield node, future.result()
+                except Exception as error:
+                    # Peers can send anything, so malformed data may fail in any number of ways
+                    logging.warning(f'Could not fetch from `{node}`: {error!r}')
+        except TimeoutError:
+            slow = [node for future, node in futures.items() if not future.done()]
+            logging.warning(f'Deadline passed before {len(slow)} node(s) responded: {", ".join(slow)}')
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def fetch_chain(self, node: str, locator: list = None) -> Tuple[int, list]:
+        """Fetches the chain of a node, as served by its `/chain` endpoint
+
+        Args:
+          node (str): Address of a node. E.g. '192.168.0.5:5000'
+          locator (list): A block locator for our chain, so that only blocks after the fork are sent
+
+        Returns:
+          tuple: The index of the first block sent and the list of blocks
+
+        """
+        start, _, blocks = self.stream_chain(node, locator)
+
+        return start, list(blocks)
+
+    def stream_chain(self, node: str, locator: list = None,
+                     deadline: float = None) -> Tuple[int, int, Iterator[Block]]:
+        """Streams the chain of a node, as served by its `/chain` endpoint, a block at a time
+
+        The response is closed once the blocks have been read, or as soon as the iterator is closed, so a
+        caller that gives up on the chain part way through does not download the rest of it.
+
+        Args:
+          node (str): Address of a node. E.g. '192.168.0.5:5000'
+          locator (list): A block locator for our chain, so that only blocks after the fork are sent
+          deadline (float): The time after which reading the blocks raises `requests.Timeout`, or None
+
+        Returns:
+          tuple: The index of the first block sent, the length of the node's chain, and an iterator over the
+            blocks as they arrive
+
+        """
+        logging.info(f'Fetching chain from: {node}')
+        params = {'format': 'binary', 'locator': locator} if locator else {'format': 'binary'}
+        response = self.get(node, '/chain', params=params, stream=True)
+
+        try:
+            response.raise_for_status()
+            start, length, blocks = stream_blocks(response, deadline)
+        except Exception:
+            response.close()
+            raise
+
+        def read() -> Iterator[Block]:
+            try:
+                yield from blocks
+            finally:
+                response.close()
+
+        return start, length, read()
+
+    def fetch_headers(self, node: str, locator: list = None) -> Tuple[int, list]:
+        """Fetches block headers from a node, as served by its `/chain/headers` endpoint
+
+        Args:
+          node (str): Address of a node. E.g. '192.168.0.5:5000'
+          locator (list): A block locator for our chain, so that only headers after the fork are sent
+
+        Returns:
+          tuple: The index of the first header sent and the list of headers
+
+        """
+        logging.info(f'Fetching headers from: {node}')
+        response = self.get(node, '/chain/headers', params={'locator': locator} if locator else None)
+        response.raise_for_status()
+        payload = response.json()
+
+        return payload.get('start', 1), payload['headers']
+
+    def fetch_blocks(self, node: str, since: str = None, limit: int = None) -> list:
+        """Fetches the blocks of a node's chain that follow the block with hash `since`, or all of them
+
+        Args:
+          node (str): Address of a node. E.g. '192.168.0.5:5000'
+          since (str): The hash of the block before the first one wanted
+          limit (int): The most blocks to fetch
+
+        Returns:
+          list: The blocks
+
+        """
+        logging.info(f'Fetching blocks from: {node}, since {since or "genesis"}')
+        params = {'format': 'binary', 'since': since} if since else {'format': 'binary'}
+
+        if limit is not None:
+            params['limit'] = limit
+        response = self.get(node, '/chain', params=params, stream=True)
+
+        try:
+            response.raise_for_status()
+
+            return parse_blocks(response)[1]
+        finally:
+            response.close()
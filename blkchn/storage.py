@@ -0,0 +1,255 @@
+from array import array
+from collections.abc import Sequence
+import logging
+from mmap import ACCESS_READ, mmap
+import os
+import struct
+from typing import Iterator
+
+from blkchn import encoding
+from blkchn.block import Block
+
+
+logging.basicConfig(level=logging.DEBUG)
+
+# Each record in a segment file is the length of the rest of the record, the raw block hash, then the block
+RECORD_HEADER = struct.Struct('>I32s')
+
+
+class Splice(Sequence):
+    """A chain made of the first `fork` blocks of one chain followed by other blocks, without copying either.
+
+    Used to validate a peer's blocks in the context of our own chain, whatever storage it lives in.
+
+    """
+    def __init__(self, chain: Sequence, fork: int, blocks: list):
+        self.chain = chain
+        self.fork = fork
+        self.blocks = blocks
+
+    def __len__(self) -> int:
+        return self.fork + len(self.blocks)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+
+        if position < 0:
+            position += len(self)
+
+        if not 0 <= position < len(self):
+            raise IndexError('chain index out of range')
+
+        return self.chain[position] if position < self.fork else self.blocks[position - self.fork]
+
+
+class SegmentStore(Sequence):
+    """A durable, append-only store of sealed blocks.
+
+    Blocks are written to a segment file as length prefixed records, and the offset of every record is kept
+    in an index file alongside it. Opening a store only reads the index, and a block is read from the segment
+    file when it is asked for, so a node can reopen its chain in time proportional to the size of the index.
+    Appends are fsynced in batches of `sync_every`, and whenever the chain is truncated.
+
+    Blocks are decoded on demand from a read-only memory map of the segment file, so historical blocks live
+    in the page cache rather than as Python objects. Only the most recent `hot_blocks` are kept as objects.
+
+    The hash of every block is also kept in a third file, so the hash index of a reopened chain is loaded with
+    one sequential read rather than by visiting every record. A missing or short hash file is rebuilt from the
+    record headers when the store is opened.
+
+    The store behaves like the list a chain is otherwise kept in: blocks are read by position or slice,
+    added with `append` or `extend`, and a reorganisation removes the tail with `del store[position:]`.
+
+    Attributes:
+      directory (str): The directory holding `blocks.dat`, `blocks.idx` and `blocks.hashes`
+      sync_every (int): How many appended blocks may be waiting to be fsynced
+      hot_blocks (int): How many of the most recent blocks are kept as live objects
+
+    """
+    def __init__(self, directory: str, sync_every: int = 64, hot_blocks: int = 128):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.sync_every = sync_every
+        self.hot_blocks = hot_blocks
+        self.hot = dict()
+        self.map = None
+        self.segment = open(os.path.join(directory, 'blocks.dat'), 'a+b')
+        self.index_file = open(os.path.join(directory, 'blocks.idx'), 'a+b')
+        self.hash_file = open(os.path.join(directory, 'blocks.hashes'), 'a+b')
+        self.offsets = array('Q')
+        self.raw_hashes = bytearray()  # The raw 32 byte hash of every block, in order
+        self.unsynced = 0
+        self._open()
+
+    def _open(self) -> None:
+        """Loads the index and discards anything left over from a write that did not complete."""
+        size = os.fstat(self.index_file.fileno()).st_size
+        self.index_file.seek(0)
+        self.offsets.frombytes(self.index_file.read(size - size % self.offsets.itemsize))
+        segment_size = os.fstat(self.segment.fileno()).st_size
+
+        # Drop indexed records that were never completely written, then any unindexed bytes after the last
+        while self.offsets and self._end_of(len(self.offsets) - 1) > segment_size:
+            self.offsets.pop()
+
+        end = self._end_of(len(self.offsets) - 1) if self.offsets else 0
+
+        if end != segment_size or size != len(self.offsets) * self.offsets.itemsize:
+            logging.warning(f'Recovering block store in `{self.directory}` from an incomplete write.')
+            self.segment.truncate(end)
+            self.index_file.truncate(len(self.offsets) * self.offsets.itemsize)
+            self.sync()
+
+        self._load_hashes()
+
+        logging.info(f'Opened block store in `{self.directory}` with {len(self.offsets)} blocks.')
+
+    def _load_hashes(self) -> None:
+        """Loads the hash of every block, rebuilding any the hash file is missing from the record headers."""
+        size = os.fstat(self.hash_file.fileno()).st_size
+        self.hash_file.seek(0)
+        self.raw_hashes = bytearray(self.hash_file.read(min(size - size % 32, len(self.offsets) * 32)))
+        loaded = len(self.raw_hashes) // 32
+
+        if len(self.raw_hashes) == size and loaded == len(self.offsets):
+            return
+
+        logging.warning(f'Rebuilding {len(self.offsets) - loaded} block hash(es) in `{self.directory}`.')
+        self.hash_file.truncate(len(self.raw_hashes))
+
+        for position in range(loaded, len(self.offsets)):
+            offset = self.offsets[position]
+            self.raw_hashes += RECORD_HEADER.unpack_from(self._mapped(offset + RECORD_HEADER.size), offset)[1]
+
+        self.hash_file.write(self.raw_hashes[loaded * 32:])
+        self.sync()
+
+    def _end_of(self, position: int) -> int:
+        """Returns the offset just past the record at `position`."""
+        offset = self.offsets[position]
+        prefix = os.pread(self.segment.fileno(), 4, offset)
+
+        return offset + 4 + struct.unpack('>I', prefix)[0] if len(prefix) == 4 else float('inf')
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+
+        if position < 0:
+            position += len(self)
+
+        if not 0 <= position < len(self):
+            raise IndexError('chain index out of range')
+
+        if position in self.hot:
+            return self.hot[position]
+
+        block = self._read(self.offsets[position])
+
+        if position >= len(self) - self.hot_blocks:
+            self.hot[position] = block
+
+        return block
+
+    def __iter__(self) -> Iterator[Block]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def __delitem__(self, position: slice) -> None:
+        """Removes every block from a position onwards. Only the tail of the chain can be removed."""
+        start, stop, step = position.indices(len(self)) if isinstance(position, slice) else (position, None, 1)
+
+        if stop != len(self) or step != 1:
+            raise ValueError('Only the tail of the chain can be removed.')
+
+        if start < len(self):
+            # Reading a mapped page past the end of a truncated file is fatal, so unmap first
+            self._unmap()
+            self.hot = {held: block for held, block in self.hot.items() if held < start}
+            self.segment.truncate(self.offsets[start])
+            del self.offsets[start:]
+            self.index_file.truncate(len(self.offsets) * self.offsets.itemsize)
+            del self.raw_hashes[start * 32:]
+            self.hash_file.truncate(len(self.raw_hashes))
+            self.sync()
+
+    def _mapped(self, end: int) -> mmap:
+        """Returns a map of the segment file that covers at least the bytes before `end`.
+
+        An outgrown map is replaced rather than closed, as other threads may still be reading from it. It is
+        closed once the last of them lets go of it.
+
+        """
+        if self.map is None or len(self.map) < end:
+            self.map = mmap(self.segment.fileno(), 0, access=ACCESS_READ)
+
+        return self.map
+
+    def _unmap(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def hash_at(self, position: int) -> str:
+        """Returns the hash of the block at a position, without reading the block."""
+        if not 0 <= position < len(self):
+            raise IndexError('chain index out of range')
+
+        return self.raw_hashes[position * 32:position * 32 + 32].hex()
+
+    def hashes(self) -> Iterator[str]:
+        """Yields the hash of every block, in order, without decoding any of them."""
+        for position in range(len(self)):
+            yield self.hash_at(position)
+
+    def _read(self, offset: int) -> Block:
+        start = offset + RECORD_HEADER.size
+        length, block_hash = RECORD_HEADER.unpack_from(self._mapped(start), offset)
+        body = self._mapped(start + length - 32)[start:start + length - 32]
+
+        return Block(encoding.decode_block(body), block_hash.hex())
+
+    def append(self, block: Block) -> None:
+        body = encoding.encode_block(block)
+        offset = self.segment.seek(0, os.SEEK_END)
+        self.segment.write(RECORD_HEADER.pack(32 + len(body), bytes.fromhex(block.hash)) + body)
+        self.segment.flush()
+        self.offsets.append(offset)
+        self.index_file.write(self.offsets[-1:].tobytes())
+        self.index_file.flush()
+        self.raw_hashes += bytes.fromhex(block.hash)
+        self.hash_file.write(self.raw_hashes[-32:])
+        self.hash_file.flush()
+        self.unsynced += 1
+        self.hot[len(self) - 1] = block
+        self.hot.pop(len(self) - self.hot_blocks - 1, None)
+
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def extend(self, blocks: list) -> None:
+        for block in blocks:
+            self.append(block)
+
+        self.sync()
+
+    def sync(self) -> None:
+        """Flushes every appended block to disk."""
+        self.segment.flush()
+        self.index_file.flush()
+        self.hash_file.flush()
+        os.fsync(self.segment.fileno())
+        os.fsync(self.index_file.fileno())
+        os.fsync(self.hash_file.fileno())
+        self.unsynced = 0
+
+    def close(self) -> None:
+        self.sync()
+        self._unmap()
+        self.segment.close()
+        self.index_file.close()
+        self.hash_file.close()
@@ -0,0 +1,123 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+from multiprocessing import Event
+import os
+
+from blkchn import merkle, mining
+from blkchn.block import Block, digest
+
+
+logging.basicConfig(level=logging.DEBUG)
+
+# How many blocks each task checks
+CHUNK_SIZE = 10000
+
+# How many blocks a worker checks between looking at the shared stop flag
+STOP_CHECK_INTERVAL = 256
+
+# Set in every worker process by `_initialise`, and by the parent once any chunk fails
+_stop = None
+
+
+def _initialise(stop: Event) -> None:
+    global _stop
+    _stop = stop
+
+
+def _hash(block: dict) -> str:
+    return block.hash if isinstance(block, Block) else digest(block)
+
+
+def check_links(blocks: list, offset: int = 0, stop: Event = None) -> bool:
+    """Checks the index, hash link, Proof of Work and Merkle root between each block and its predecessor
+
+    This is the part of chain validation that only depends on a block and the one before it, so any
+    run of consecutive blocks can be checked on its own.
+
+    Args:
+      blocks (list): Consecutive blocks, the first of which is trusted and only used as a predecessor
+      offset (int): Position of the first block in its chain, which the index of every block must follow
+      stop (Event): Polled while checking, the check is abandoned when it is set
+
+    Returns:
+      bool: True if every link is valid, False if one is not or the check was abandoned
+
+    """
+    last_block = blocks[0]
+    last_hash = _hash(last_block)
+
+    for position in range(1, len(blocks)):
+        if stop is not None and position % STOP_CHECK_INTERVAL == 0 and stop.is_set():
+            return False
+
+        block = blocks[position]
+
+        if block.get('index') != offset + position + 1:
+            logging.critical(f'Block {offset + position} claims index {block.get("index")}.')
+            return False
+
+        if block['previous_hash'] != last_hash:
+            logging.critical(f'Previous hash of block {offset + position} does not equal the last blocks hash!')
+            return False
+
+        difficulty = block.get('difficulty', mining.DEFAULT_DIFFICULTY)
+
+        if not mining.valid_proof(last_block['proof'], block['proof'], last_hash, difficulty):
+            logging.critical(f'The proof of block {offset + position} is invalid. The blockchain is corrupt.')
+            return False
+
+        if 'merkle_root' in block and merkle.root(block['transactions']) != block['merkle_root']:
+            logging.critical(f'The transactions of block {offset + position} do not match its Merkle root.')
+            return False
+
+        last_block = block
+        last_hash = _hash(block)
+
+    return True
+
+
+def _check_chunk(blocks: list, offset: int) -> bool:
+    """Runs `check_links` in a worker process, and tells the other workers to stop if it fails."""
+    valid = check_links(blocks, offset, _stop)
+
+    if not valid:
+        _stop.set()
+
+    return valid
+
+
+def check_links_parallel(chain: list, start: int = 1, workers: int = None, chunk_size: int = CHUNK_SIZE) -> bool:
+    """Checks the links of a chain in chunks spread over a pool of processes
+
+    Each chunk overlaps the previous one by a single block, which it uses as the predecessor of its first
+    block. As soon as one chunk fails, chunks that have not started are cancelled and running ones stop.
+
+    Args:
+      chain (list): The chain to check
+      start (int): Position of the first block to check, the blocks before it are trusted
+      workers (int): Number of processes to use, defaults to the number of CPUs
+      chunk_size (int): How many blocks each task checks
+
+    Returns:
+      bool: True if every link from `start` onwards is valid, False if not
+
+    """
+    start = max(start, 1)
+    stop = Event()
+
+    with ProcessPoolExecutor(workers or os.cpu_count(), initializer=_initialise, initargs=(stop,)) as executor:
+        futures = [
+            executor.submit(_check_chunk, chain[first - 1:first + chunk_size], first - 1)
+            for first in range(start, len(chain), chunk_size)
+        ]
+
+        for future in as_completed(futures):
+            if not future.result():
+                stop.set()
+
+                for pending in futures:
+                    pending.cancel()
+
+                return False
+
+    return True
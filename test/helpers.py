@@ -0,0 +1,55 @@
+from blkchn.block import Block
+
+from time import sleep, time
+from typing import Iterable
+
+
+def payment(sender: str, recipient: str, amount: int, fee: int = None) -> dict:
+    """Returns a transaction moving `amount` from `sender` to `recipient`, offering `fee` if given."""
+    transaction = {'sender': sender, 'recipient': recipient, 'amount': amount}
+
+    if fee is not None:
+        transaction['fee'] = fee
+
+    return transaction
+
+
+def reward(recipient: str = 'miner', amount: int = 10) -> dict:
+    """Returns a mining reward, which only `new_block` may add to the chain."""
+    return {'sender': '0', 'recipient': recipient, 'amount': amount}
+
+
+def mine(blockchain, blocks: int = 1, transactions: Iterable[dict] = (), miner: str = None) -> Block:
+    """Submits transactions, then adds `blocks` valid blocks to the end of a chain
+
+    Args:
+      blockchain (Blockchain): The chain to mine onto
+      blocks (int): How many blocks to add
+      transactions (Iterable): Transactions to submit before the first block
+      miner (str): The address each block rewards, or None for blocks without a reward
+
+    Returns:
+      Block: The last block added
+
+    """
+    for transaction in transactions:
+        blockchain.new_transaction(transaction)
+
+    for _ in range(blocks):
+        last_block = blockchain.last_block
+        blockchain.new_block(blockchain.proof_of_work(last_block), last_block.hash,
+                             None if miner is None else reward(miner))
+
+    return blockchain.last_block
+
+
+def wait_for(condition, timeout: float = 10) -> bool:
+    """Polls a condition until it holds or the timeout passes."""
+    deadline = time() + timeout
+
+    while not condition():
+        if time() > deadline:
+            return False
+        sleep(0.01)
+
+    return True
@@ -0,0 +1,82 @@
+from app import app as api
+from blkchn import Blockchain, encoding
+from test.helpers import mine
+
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+
+class TestApp(TestCase):
+
+    def setUp(self):
+        self.blockchain = Blockchain(difficulty=1)
+        self.client = api.app.test_client()
+        patcher = patch.object(api, 'blockchain', self.blockchain)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batch_json_array(self):
+        """Tests that a JSON array of transactions is added in one request, with a result for each."""
+        batch = [{'sender': 'a', 'recipient': 'b', 'amount': n} for n in range(3)]
+        response = self.client.post('/transactions/batch', json=batch + [batch[0], {'sender': 'a'}])
+        statuses = [result['status'] for result in response.get_json()['results']]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(statuses, ['added', 'added', 'added', 'duplicate', 'invalid'])
+        self.assertEqual(len(self.blockchain.mempool), 3)
+
+    def test_batch_ndjson(self):
+        """Tests that a batch can be streamed as NDJSON, and that a malformed line only fails itself."""
+        lines = [json.dumps({'sender': 'a', 'recipient': 'b', 'amount': n}) for n in range(2)] + ['{']
+        response = self.client.post('/transactions/batch', data='\n'.join(lines),
+                                    content_type='application/x-ndjson')
+        statuses = [result['status'] for result in response.get_json()['results']]
+        self.assertEqual(statuses, ['added', 'added', 'invalid'])
+        self.assertEqual(response.get_json()['added'], 2)
+
+    def test_batch_rejects_other_bodies(self):
+        """Tests that a body which is neither a JSON array nor NDJSON is refused."""
+        response = self.client.post('/transactions/batch', json={'sender': 'a'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_mints_are_refused(self):
+        """Tests that transactions from the mint are refused, alone or in a batch."""
+        mint = {'sender': '0', 'recipient': 'a', 'amount': 100}
+        self.assertEqual(self.client.post('/transactions/new', json=mint).status_code, 400)
+        response = self.client.post('/transactions/batch', json=[mint])
+        self.assertEqual(response.get_json()['results'][0]['status'], 'invalid')
+        self.assertEqual(len(self.blockchain.mempool), 0)
+
+    def test_chain_formats_agree(self):
+        """Tests that the streamed JSON, NDJSON and binary forms of the chain hold the same blocks."""
+        mine(self.blockchain, 3)
+
+        payload = self.client.get('/chain?from=2').get_json()
+        lines = self.client.get('/chain?from=2&format=ndjson').get_data(as_text=True).splitlines()
+        binary = self.client.get('/chain?from=2&format=binary')
+        expected = [block.to_dict() for block in self.blockchain.chain[1:]]
+        self.assertEqual((payload['start'], payload['length']), (2, 4))
+        self.assertEqual(payload['chain'], expected)
+        self.assertEqual([json.loads(line) for line in lines], expected)
+        self.assertEqual(list(encoding.decode_chain(binary.get_data())), expected)
+        self.assertEqual(binary.headers['X-Chain-Length'], '4')
+
+    def test_chain_window(self):
+        """Tests that a window of the chain can be fetched by index range and limit."""
+        mine(self.blockchain, 5)
+
+        def indexes(query):
+            return [block['index'] for block in self.client.get('/chain?' + query).get_json()['chain']]
+
+        self.assertEqual(indexes('from=2&to=4'), [2, 3, 4])
+        self.assertEqual(indexes('from=3&limit=2'), [3, 4])
+        self.assertEqual(indexes('from=5&to=2'), [])
+        self.assertEqual(self.client.get('/chain?limit=1').get_json()['length'], 6)
+
+    def test_block_lookup(self):
+        """Tests that a block can be fetched by its index or by its hash."""
+        block = mine(self.blockchain)
+        self.assertEqual(self.client.get('/blocks/2').get_json()['hash'], block.hash)
+        self.assertEqual(self.client.get(f'/blocks/by-hash/{block.hash}').get_json()['index'], 2)
+        self.assertEqual(self.client.get('/blocks/3').status_code, 404)
+        self.assertEqual(self.client.get('/blocks/by-hash/00').status_code, 404)
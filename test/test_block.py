@@ -0,0 +1,46 @@
+from blkchn.block import Block, Transaction, digest
+
+from pickle import dumps, loads
+from unittest import TestCase
+
+
+class TestBlock(TestCase):
+
+    def setUp(self):
+        self.fields = {'index': 1, 'transactions': [{'amount': 1}], 'proof': 100, 'previous_hash': '1'}
+
+    def test_hash_matches_plain_dictionary(self):
+        """Tests that sealing a block does not change its hash."""
+        self.assertEqual(Block(self.fields).hash, digest(self.fields))
+
+    def test_sealed_block_is_immutable(self):
+        """Tests that a sealed block rejects modification."""
+        block = Block(self.fields)
+
+        with self.assertRaises(TypeError):
+            block['proof'] = 0
+
+        with self.assertRaises(TypeError):
+            block.proof = 0
+
+        with self.assertRaises(TypeError):
+            block['transactions'][0].amount = 2
+
+    def test_pickle_round_trip(self):
+        """Tests that a block survives being sent to another process along with its hash."""
+        block = Block(self.fields)
+        self.assertEqual(loads(dumps(block)).hash, block.hash)
+        self.assertEqual(loads(dumps(block)), block)
+
+    def test_dictionary_view(self):
+        """Tests that a block reads like the dictionary it was created from, including unknown fields."""
+        block = Block(dict(self.fields, memo='hello'))
+        self.assertEqual(block.to_dict(), dict(self.fields, memo='hello'))
+        self.assertNotIn('difficulty', block)
+        self.assertIsInstance(block['transactions'][0], Transaction)
+        self.assertEqual(block.get('memo'), 'hello')
+
+    def test_slots(self):
+        """Tests that blocks and transactions have no per-instance dictionary."""
+        self.assertFalse(hasattr(Block(self.fields), '__dict__'))
+        self.assertFalse(hasattr(Transaction({}), '__dict__'))
@@ -1,6 +1,10 @@
 from blkchn import Blockchain
+from test.helpers import mine
 
+from threading import Thread
+from time import time
 from unittest import TestCase
+from unittest.mock import patch
 
 
 class TestBlockchain(TestCase):
@@ -16,3 +20,162 @@ class TestBlockchain(TestCase):
     def test_new_transaction_id(self):
         """Tests that the new ID on a new blockchain is N+1 from the genesis block."""
         self.assertEqual(self.blockchain.new_transaction({}), 2)
+
+    def test_new_block_records_difficulty(self):
+        """Tests that blocks carry the difficulty they were mined at."""
+        blockchain = Blockchain(difficulty=8)
+        last_block = blockchain.last_block
+        proof = blockchain.proof_of_work(last_block)
+        block = blockchain.new_block(proof, blockchain.hash(last_block))
+        self.assertEqual(block['difficulty'], 8)
+        self.assertTrue(blockchain.valid_proof(last_block['proof'], proof, blockchain.hash(last_block), 8))
+        self.assertTrue(blockchain.valid_chain(blockchain.chain))
+
+    def test_retarget_raises_difficulty_when_blocks_are_fast(self):
+        """Tests that blocks arriving faster than the block interval raise the difficulty."""
+        blockchain = Blockchain(difficulty=8, block_interval=10, retarget_interval=4)
+        chain = [{'created_at': float(n), 'difficulty': 8} for n in range(4)]
+        self.assertEqual(blockchain.expected_difficulty(chain, 3), 8)
+        self.assertEqual(blockchain.expected_difficulty(chain, 4), 10)
+
+    def test_retarget_lowers_difficulty_when_blocks_are_slow(self):
+        """Tests that blocks arriving slower than the block interval lower the difficulty."""
+        blockchain = Blockchain(difficulty=8, block_interval=10, retarget_interval=4)
+        chain = [{'created_at': n * 20.0, 'difficulty': 8} for n in range(4)]
+        self.assertEqual(blockchain.expected_difficulty(chain, 4), 7)
+
+    def test_valid_chain_rejects_wrong_difficulty(self):
+        """Tests that a block claiming a difficulty other than the scheduled one invalidates the chain."""
+        blockchain = Blockchain(difficulty=8)
+        mine(blockchain)
+        chain = [blockchain.chain[0], dict(blockchain.chain[1].to_dict(), difficulty=1)]
+        self.assertFalse(blockchain.valid_chain(chain))
+
+    def test_difficulty_is_required_after_first_retarget(self):
+        """Tests that only blocks before the first retarget may leave out their difficulty."""
+        blockchain = Blockchain(difficulty=8, block_interval=10, retarget_interval=4)
+        chain = [{'created_at': n * 10.0, 'difficulty': 8} for n in range(5)]
+        self.assertTrue(blockchain.valid_difficulty(chain, 4))
+        del chain[4]['difficulty']
+        self.assertFalse(blockchain.valid_difficulty(chain, 4))
+        del chain[3]['difficulty']
+        self.assertTrue(blockchain.valid_difficulty(chain, 3))
+
+    def test_timestamps_must_follow_median_and_not_be_in_future(self):
+        """Tests that a block must be created after the median of recent blocks and not too far ahead."""
+        chain = [{'created_at': 100 + n} for n in range(5)] + [{'created_at': 102}]
+        self.assertFalse(Blockchain.valid_timestamp(chain, 5))
+        chain[5]['created_at'] = 103
+        self.assertTrue(Blockchain.valid_timestamp(chain, 5))
+        chain[5]['created_at'] = time() + 3 * 60 * 60
+        self.assertFalse(Blockchain.valid_timestamp(chain, 5))
+
+    def test_valid_chain_rejects_future_block(self):
+        """Tests that a block stamped far in the future invalidates the chain."""
+        blockchain = Blockchain(difficulty=1)
+        mine(blockchain)
+        chain = [blockchain.chain[0], dict(blockchain.chain[1].to_dict(), created_at=int(time()) + 10 ** 6)]
+        self.assertFalse(blockchain.valid_chain(chain, start=1))
+
+    def test_blocks_mined_quickly_keep_valid_timestamps(self):
+        """Tests that blocks mined within the same second are still stamped after the median of recent blocks."""
+        blockchain = Blockchain(difficulty=1)
+        mine(blockchain, 15)
+        self.assertTrue(blockchain.valid_chain(blockchain.chain, start=1))
+
+    def test_chain_with_more_blocks_but_less_work_is_ignored(self):
+        """Tests that consensus compares the work of chains rather than their length."""
+        blockchain = Blockchain(difficulty=8)
+        blockchain.new_block(1, None)
+        blockchain.register_node('peer:5000')
+        cheap = [{'index': n, 'difficulty': 1} for n in range(2, 12)]
+        self.assertLess(blockchain.excess_work(1, cheap), 0)
+        self.assertGreater(blockchain.excess_work(1, cheap + [{'difficulty': 9}]), 0)
+
+        with patch.object(blockchain.peers, 'fetch_headers', return_value=(2, cheap)), \
+                patch.object(blockchain.peers, 'fetch_blocks') as fetch_blocks:
+            self.assertFalse(blockchain.resolve_conflicts())
+            fetch_blocks.assert_not_called()
+
+    def test_new_block_takes_pending_transactions(self):
+        """Tests that pending transactions go into the next block and are not added to it afterwards."""
+        self.blockchain.new_transaction({'sender': 'a', 'recipient': 'b', 'amount': 1})
+        block = self.blockchain.new_block(100, None)
+        self.blockchain.new_transaction({'sender': 'b', 'recipient': 'a', 'amount': 1})
+        self.assertEqual(len(block['transactions']), 1)
+        self.assertEqual(block.hash, Blockchain.hash(block.to_dict()))
+
+    def test_shared_prefix(self):
+        """Tests that the prefix a chain shares with ours is measured by comparing hashes."""
+        blockchain = Blockchain(difficulty=1)
+        mine(blockchain, 3)
+        chain = [block.to_dict() for block in blockchain.chain[:2]] + [{'index': 3}]
+        self.assertEqual(blockchain.shared_prefix(chain), 2)
+        self.assertEqual(blockchain.shared_prefix(blockchain.chain), 4)
+
+    def test_shared_prefix_hashes_logarithmically_many_blocks(self):
+        """Tests that the shared prefix of a chain of plain blocks is found without hashing each of them."""
+        blockchain = Blockchain(difficulty=1)
+        mine(blockchain, 63)
+        chain = [block.to_dict() for block in blockchain.chain[:40]] + [{'index': 41}] * 24
+
+        with patch.object(blockchain, 'hash', wraps=blockchain.hash) as hash:
+            self.assertEqual(blockchain.shared_prefix(chain), 40)
+
+        self.assertLessEqual(hash.call_count, 7)
+
+    def test_valid_chain_only_checks_blocks_after_shared_prefix(self):
+        """Tests that validation starts after the blocks the candidate chain shares with ours."""
+        blockchain = Blockchain(difficulty=1)
+        mine(blockchain)
+
+        with patch.object(blockchain, 'valid_proof', wraps=blockchain.valid_proof) as valid_proof:
+            self.assertTrue(blockchain.valid_chain(blockchain.chain))
+            valid_proof.assert_not_called()
+            self.assertTrue(blockchain.valid_chain(blockchain.chain, start=1))
+            valid_proof.assert_called_once()
+
+    def test_positions_follow_chain_changes(self):
+        """Tests that the hash index follows new blocks, replaced tails and reassigned chains."""
+        blockchain = Blockchain(difficulty=1)
+        mine(blockchain, 3)
+        removed = blockchain.chain[2:]
+        blockchain._replace_tail(2, [])
+        self.assertEqual(blockchain.position({block.hash for block in removed}), None)
+        self.assertIs(blockchain.block_by_hash(blockchain.chain[1].hash), blockchain.chain[1])
+        blockchain.chain = blockchain.chain[:1]
+        self.assertEqual(blockchain.positions, {blockchain.chain[0].hash: 0})
+
+    def test_no_transaction_is_lost_to_concurrent_blocks(self):
+        """Tests that every transaction submitted while blocks are mined ends up in a block or pending."""
+        blockchain = Blockchain(difficulty=1)
+        threads = [Thread(target=lambda sender=sender: [blockchain.new_transaction({'sender': sender, 'n': n})
+                                                         for n in range(200)]) for sender in 'abcd']
+        threads.append(Thread(target=lambda: [blockchain.new_block(1, None) for _ in range(100)]))
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join(30)
+            self.assertFalse(thread.is_alive())
+
+        mined = [tx for block in blockchain.chain for tx in block['transactions']]
+        self.assertEqual(len(blockchain.chain), 101)
+        self.assertEqual(len(mined) + len(blockchain.mempool), 800)
+
+    def test_extend_tip_only_extends_the_block_the_proof_is_for(self):
+        """Tests that a block is not added on top of a tip that has since changed."""
+        tip = self.blockchain.last_block.hash
+        self.assertEqual(self.blockchain.extend_tip(1, tip)['previous_hash'], tip)
+        self.assertIsNone(self.blockchain.extend_tip(1, tip))
+        self.assertEqual(len(self.blockchain.chain), 2)
+
+    def test_blocks_stop_when_chain_is_reorganised(self):
+        """Tests that streamed blocks stop at a reorganisation rather than mixing two chains."""
+        for _ in range(3):
+            self.blockchain.new_block(1, None)
+        blocks = self.blockchain.blocks()
+        self.assertIs(next(blocks), self.blockchain.chain[0])
+        self.blockchain._replace_tail(1, [])
+        self.assertEqual(list(blocks), [])
@@ -0,0 +1,77 @@
+from blkchn import Blockchain
+from blkchn.daemon import BlockTemplate, Miner
+from test.helpers import mine, reward, wait_for
+
+from unittest import TestCase
+from unittest.mock import PropertyMock, patch
+
+
+class TestMiner(TestCase):
+
+    def test_mines_continuously(self):
+        """Tests that the miner keeps forging valid blocks, each taking the transactions pending at the time."""
+        blockchain = Blockchain(difficulty=4)
+        miner = Miner(blockchain, reward)
+        blockchain.new_transaction({'sender': 'a', 'recipient': 'b', 'amount': 1})
+        miner.start()
+        self.assertTrue(wait_for(lambda: miner.blocks >= 3))
+        miner.stop()
+        self.assertFalse(miner.running)
+        self.assertTrue(blockchain.valid_chain(blockchain.chain, start=1))
+        self.assertEqual(blockchain.chain[1]['transactions'][0]['recipient'], 'b')
+
+    def test_template_is_refreshed_and_search_restarted(self):
+        """Tests that a mempool change refreshes the template, and only a new tip restarts the search."""
+        blockchain = Blockchain(difficulty=40)
+        miner = Miner(blockchain, reward)
+        miner.start()
+        self.assertTrue(wait_for(lambda: miner.template is not None))
+
+        blockchain.new_transaction({'sender': 'a', 'recipient': 'b', 'amount': 1})
+        self.assertTrue(wait_for(lambda: miner.template.pending == 1))
+        self.assertEqual((miner.refreshes, miner.restarts), (1, 0))
+
+        blockchain.new_block(0, None)
+        self.assertTrue(wait_for(lambda: miner.restarts == 1))
+        self.assertEqual(miner.template.index, 3)
+        miner.stop()
+        self.assertEqual(len(blockchain.chain), 2)
+
+    def test_refreshed_template_stays_on_the_searched_tip(self):
+        """Tests that a template refreshed as the tip moves is still built on the block being searched on."""
+        blockchain = Blockchain(difficulty=4)
+        miner = Miner(blockchain, reward)
+        miner.last_block = blockchain.last_block
+        miner.template = BlockTemplate(blockchain, miner.last_block, reward())
+        blockchain.new_transaction({'sender': 'a', 'recipient': 'b', 'amount': 1})
+        new_tip = blockchain.new_block(0, None)
+
+        # The tip is checked before it moves, and any later read of it would see the new block
+        with patch.object(Blockchain, 'last_block', new_callable=PropertyMock,
+                          side_effect=[miner.last_block, new_tip, new_tip]):
+            self.assertFalse(miner._stale())
+
+        self.assertEqual(miner.template.last_hash, blockchain.chain[0].hash)
+        self.assertEqual(miner.template.index, 2)
+
+    def test_template_difficulty_follows_its_last_block(self):
+        """Tests that a template's difficulty is that of the block after its last block, not after the tip."""
+        blockchain = Blockchain(difficulty=1, block_interval=1000, retarget_interval=2)
+        mine(blockchain)
+        template = BlockTemplate(blockchain, blockchain.chain[0], reward())
+        self.assertEqual(template.difficulty, 1)
+        self.assertGreater(blockchain.next_difficulty(), 1)
+
+    def test_workers_are_kept_between_blocks(self):
+        """Tests that a miner with several workers mines every block on the same processes, and stops them."""
+        blockchain = Blockchain(workers=2, difficulty=4)
+        miner = Miner(blockchain, reward)
+        miner.start()
+        self.assertTrue(wait_for(lambda: miner.searcher is not None))
+        processes = list(miner.searcher.processes)
+        self.assertTrue(wait_for(lambda: miner.blocks >= 3))
+        self.assertEqual(miner.searcher.processes, processes)
+        miner.stop()
+        self.assertIsNone(miner.searcher)
+        self.assertFalse(any(process.is_alive() for process in processes))
+        self.assertTrue(blockchain.valid_chain(blockchain.chain, start=1))
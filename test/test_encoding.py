@@ -0,0 +1,70 @@
+from blkchn import encoding, merkle
+from blkchn.block import Block, digest
+
+from hashlib import sha256
+import json
+from unittest import TestCase
+
+
+class TestEncoding(TestCase):
+
+    def setUp(self):
+        self.fields = {
+            'version': encoding.BLOCK_VERSION,
+            'index': 2,
+            'created_at': 1600000000,
+            'transactions': [{'sender': '0', 'recipient': 'abc', 'amount': 1, 'memo': {'note': 'hi', 'n': 1.5}}],
+            'proof': 35293,
+            'previous_hash': 'f' * 64,
+            'difficulty': 16,
+        }
+        self.fields['merkle_root'] = merkle.root(self.fields['transactions'])
+
+    def test_block_round_trip(self):
+        """Tests that decoding an encoded block gives back its fields."""
+        self.assertEqual(encoding.decode_block(encoding.encode_block(self.fields)), self.fields)
+
+    def test_versioned_block_hashes_binary_header(self):
+        """Tests that versioned blocks are hashed over their binary header, whatever order fields are in."""
+        expected = sha256(encoding.encode_header(self.fields)).hexdigest()
+        self.assertEqual(Block(dict(reversed(list(self.fields.items())))).hash, expected)
+        self.assertEqual(Block(dict(self.fields, transactions=[])).hash, expected)
+
+    def test_legacy_block_hashes_as_json(self):
+        """Tests that blocks without a version still hash as JSON, and survive a binary round trip."""
+        legacy = dict(self.fields, created_at=1600000000.123)
+        del legacy['version'], legacy['merkle_root']
+        self.assertEqual(digest(legacy), sha256(json.dumps(legacy, sort_keys=True).encode()).hexdigest())
+        self.assertEqual(encoding.decode_block(encoding.encode_block(legacy)), legacy)
+
+    def test_fractional_timestamp_is_rejected(self):
+        """Tests that a versioned block must carry its timestamp as an integer."""
+        with self.assertRaises(ValueError):
+            encoding.encode_block(dict(self.fields, created_at=1.5))
+
+    def test_chain_round_trip(self):
+        """Tests that a run of blocks is framed for transfer and read back, and that truncation is detected."""
+        data = b''.join(encoding.encode_chain([self.fields, dict(self.fields, index=3)]))
+        self.assertEqual([block['index'] for block in encoding.decode_chain(data)], [2, 3])
+
+        with self.assertRaises(ValueError):
+            list(encoding.decode_chain(data[:-1]))
+
+    def test_read_chain_from_chunks(self):
+        """Tests that blocks are decoded as they arrive, however the data is split into chunks."""
+        data = b''.join(encoding.encode_chain([self.fields, dict(self.fields, index=3)]))
+        chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+        self.assertEqual([block['index'] for block in encoding.read_chain(chunks)], [2, 3])
+
+        with self.assertRaises(ValueError):
+            list(encoding.read_chain(chunks[:-1]))
+
+    def test_read_chain_refuses_oversized_records(self):
+        """Tests that a record declaring more than the maximum size is refused before it is buffered."""
+        data = b''.join(encoding.encode_chain([self.fields]))
+
+        with self.assertRaises(ValueError):
+            list(encoding.read_chain([data], max_record_size=len(data) - 5))
+
+        with self.assertRaises(ValueError):
+            next(encoding.read_chain([b'\xff\xff\xff\xff']))
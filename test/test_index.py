@@ -0,0 +1,42 @@
+from blkchn import Blockchain
+from blkchn.index import TransactionIndex
+from blkchn.mempool import txid
+from test.helpers import mine, payment
+
+from unittest import TestCase
+
+
+class TestTransactionIndex(TestCase):
+
+    def setUp(self):
+        self.blockchain = Blockchain(difficulty=1)
+
+        for transactions in ([payment('a', 'b', 1), payment('b', 'c', 2)], [payment('a', 'a', 3)]):
+            mine(self.blockchain, transactions=transactions)
+
+    def test_lookup_by_id(self):
+        """Tests that a mined transaction is found by id, along with the block holding it."""
+        found = self.blockchain.find_transaction(txid(payment('b', 'c', 2)))
+        self.assertEqual(found['blocks'], [2])
+        self.assertEqual(found['transaction'], payment('b', 'c', 2))
+        self.assertIsNone(self.blockchain.find_transaction(txid(payment('c', 'a', 1))))
+
+    def test_lookup_by_address(self):
+        """Tests that an address's transactions are paged through in chain order, self transfers listed once."""
+        amounts = [item['transaction']['amount'] for item in self.blockchain.address_transactions('a')]
+        self.assertEqual(amounts, [1, 3])
+        page = self.blockchain.address_transactions('b', offset=1, limit=1)
+        self.assertEqual([item['transaction']['amount'] for item in page], [2])
+        sent = self.blockchain.address_transactions('b', role='sender')
+        self.assertEqual([item['block'] for item in sent], [2])
+
+    def test_index_follows_new_blocks_and_reorgs(self):
+        """Tests that the index takes in new blocks and drops the transactions of blocks removed by a reorg."""
+        index = self.blockchain.transaction_index
+        mine(self.blockchain, transactions=[payment('c', 'd', 4)])
+        self.assertEqual(index.locate(txid(payment('c', 'd', 4))), [(3, 0)])
+
+        self.blockchain._replace_tail(2, [])
+        self.assertEqual(index.locate(txid(payment('c', 'd', 4))), [])
+        self.assertNotIn('d', index.recipients)
+        self.assertEqual(vars(index), vars(TransactionIndex.build(self.blockchain.chain)))
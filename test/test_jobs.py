@@ -0,0 +1,35 @@
+from blkchn import Blockchain
+from blkchn.jobs import CANCELLED, DONE, RUNNING, MiningJobs
+from test.helpers import reward, wait_for
+
+from unittest import TestCase
+
+
+class TestMiningJobs(TestCase):
+
+    def test_job_forges_block(self):
+        """Tests that a submitted job returns straight away and forges a block in the background."""
+        blockchain = Blockchain(difficulty=4)
+        jobs = MiningJobs(blockchain, reward)
+        job = jobs.submit()
+        self.assertTrue(wait_for(lambda: job.status == DONE))
+        self.assertIs(job.block, blockchain.last_block)
+        self.assertEqual(job.to_dict()['block']['transactions'], [reward()])
+        self.assertTrue(blockchain.valid_chain(blockchain.chain, start=1))
+
+    def test_job_restarts_when_tip_changes_and_can_be_cancelled(self):
+        """Tests that a running job starts again on a new tip, and stops when it is cancelled."""
+        blockchain = Blockchain(difficulty=40)
+        jobs = MiningJobs(blockchain, reward)
+        job = jobs.submit()
+        queued = jobs.submit()
+        self.assertTrue(wait_for(lambda: job.status == RUNNING))
+
+        blockchain.new_block(0, None)
+        self.assertTrue(wait_for(lambda: job.restarts == 1))
+
+        jobs.cancel(queued.id)
+        jobs.cancel(job.id)
+        self.assertTrue(wait_for(lambda: job.status == CANCELLED))
+        self.assertEqual(queued.status, CANCELLED)
+        self.assertEqual(len(blockchain.chain), 2)
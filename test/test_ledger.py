@@ -0,0 +1,88 @@
+from blkchn import Blockchain
+from blkchn.ledger import Ledger
+from test.helpers import mine, payment, reward
+
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+
+class TestLedger(TestCase):
+
+    def test_balances_follow_blocks(self):
+        """Tests that rewards mint coins and payments move them from sender to recipient."""
+        blockchain = Blockchain(difficulty=1)
+        mine(blockchain, miner='a')
+        mine(blockchain, transactions=[payment('a', 'b', 4)], miner='a')
+        self.assertEqual(blockchain.balance('a'), 16)
+        self.assertEqual(blockchain.balance('b'), 4)
+        self.assertEqual(blockchain.ledger.length, 3)
+
+    def test_reorg_reverts_and_reapplies(self):
+        """Tests that replacing the tail of the chain reverts its blocks and applies the new ones."""
+        blockchain = Blockchain(difficulty=1)
+        mine(blockchain, miner='a')
+        fork = mine(blockchain, miner='b')
+        blockchain.balance('a')
+
+        other = Blockchain(difficulty=1)
+        other.chain = blockchain.chain[:2]
+        replacement = mine(other, miner='c')
+        blockchain._replace_tail(2, [replacement])
+        self.assertNotIn(fork, blockchain.chain)
+        self.assertEqual(blockchain.ledger.balances, {'a': 10, 'c': 10})
+        self.assertEqual(blockchain.ledger.tip, replacement.hash)
+
+    def test_snapshot_resumes_from_tip(self):
+        """Tests that a snapshotted ledger is reloaded, and rebuilt when it no longer matches the chain."""
+        with TemporaryDirectory() as directory:
+            snapshot = os.path.join(directory, 'ledger.json')
+            blockchain = Blockchain(difficulty=1, ledger=Ledger(snapshot, snapshot_every=1))
+            mine(blockchain, miner='a')
+            mine(blockchain, miner='a')
+
+            reloaded = Ledger(snapshot)
+            self.assertEqual((reloaded.length, reloaded.tip), (3, blockchain.last_block.hash))
+
+            stale = Blockchain(difficulty=1, ledger=reloaded)
+            stale.chain = blockchain.chain[:2]
+            self.assertEqual(stale.balance('a'), 10)
+
+    def test_negative_and_non_finite_amounts_are_refused(self):
+        """Tests that an amount that would take coins from the recipient or poison the checks is refused."""
+        blockchain = Blockchain(difficulty=1, reject_overspends=True)
+        mine(blockchain, miner='victim')
+
+        for amount in (-10, float('nan'), float('inf')):
+            with self.assertRaises(ValueError):
+                blockchain.new_transaction(payment('thief', 'victim', amount))
+
+        self.assertEqual(len(blockchain.mempool), 0)
+        self.assertEqual(blockchain.mempool.spending, {})
+        mine(blockchain)
+        self.assertEqual(blockchain.balance('victim'), 10)
+
+    def test_overspends_are_rejected(self):
+        """Tests that a transaction its sender cannot afford, counting pending ones, is refused when enabled."""
+        blockchain = Blockchain(difficulty=1, reject_overspends=True)
+        mine(blockchain, miner='a')
+        blockchain.new_transaction(payment('a', 'b', 6))
+
+        with self.assertRaises(ValueError):
+            blockchain.new_transaction(payment('a', 'c', 6))
+
+        results = blockchain.new_transactions([payment('a', 'c', 4), reward('d')])
+        self.assertEqual(results[0][1], True)
+        self.assertIsInstance(results[1][1], ValueError)
+
+    def test_mints_are_only_accepted_from_mined_blocks(self):
+        """Tests that a submitted transaction from the mint is refused, whether or not overspends are."""
+        for reject_overspends in (False, True):
+            blockchain = Blockchain(difficulty=1, reject_overspends=reject_overspends)
+
+            with self.assertRaises(ValueError):
+                blockchain.new_transaction(reward('a'))
+
+            self.assertEqual(len(blockchain.mempool), 0)
+            mine(blockchain, miner='a')
+            self.assertEqual(blockchain.balance('a'), 10)
@@ -0,0 +1,108 @@
+from blkchn.locks import ReadWriteLock
+from test.helpers import wait_for
+
+from threading import Event, Thread
+from time import sleep
+from unittest import TestCase
+
+
+class TestReadWriteLock(TestCase):
+
+    def hold(self, context, entered: Event, release: Event) -> Thread:
+        def run():
+            with context():
+                entered.set()
+                release.wait(10)
+
+        thread = Thread(target=run, daemon=True)
+        thread.start()
+
+        return thread
+
+    def test_readers_share_the_lock(self):
+        """Tests that any number of readers hold the lock at once."""
+        lock = ReadWriteLock()
+        release = Event()
+        entered = [Event() for _ in range(3)]
+        threads = [self.hold(lock.read, event, release) for event in entered]
+        self.assertTrue(wait_for(lambda: all(event.is_set() for event in entered)))
+        release.set()
+
+        for thread in threads:
+            thread.join(10)
+
+    def test_writer_excludes_readers_and_writers(self):
+        """Tests that neither a reader nor another writer gets in while a writer holds the lock."""
+        lock = ReadWriteLock()
+        release = Event()
+        writing = Event()
+        self.hold(lock.write, writing, release)
+        self.assertTrue(writing.wait(10))
+        reading, writing_again = Event(), Event()
+        reader = self.hold(lock.read, reading, Event())
+        writer = self.hold(lock.write, writing_again, Event())
+        sleep(0.1)
+        self.assertFalse(reading.is_set() or writing_again.is_set())
+        release.set()
+        self.assertTrue(wait_for(lambda: reading.is_set() or writing_again.is_set()))
+
+        for thread in (reader, writer):
+            thread.join(0)
+
+    def test_waiting_writer_holds_back_new_readers(self):
+        """Tests that once a writer waits for the readers, new readers wait behind it."""
+        lock = ReadWriteLock()
+        release_first = Event()
+        first, writing, second = Event(), Event(), Event()
+        self.hold(lock.read, first, release_first)
+        self.assertTrue(first.wait(10))
+        release_writer = Event()
+        self.hold(lock.write, writing, release_writer)
+        self.assertTrue(wait_for(lambda: lock._waiting_writers == 1))
+        self.hold(lock.read, second, Event())
+        sleep(0.1)
+        self.assertFalse(writing.is_set() or second.is_set())
+        release_first.set()
+        self.assertTrue(writing.wait(10))
+        self.assertFalse(second.is_set())
+        release_writer.set()
+        self.assertTrue(second.wait(10))
+
+    def test_readers_waiting_for_a_writer_go_in_before_the_next_writer(self):
+        """Tests that the readers a writer held back take their turn before another waiting writer."""
+        lock = ReadWriteLock()
+        release_first = Event()
+        first, reading, second = Event(), Event(), Event()
+        self.hold(lock.write, first, release_first)
+        self.assertTrue(first.wait(10))
+        release_reader = Event()
+        self.hold(lock.read, reading, release_reader)
+        self.assertTrue(wait_for(lambda: lock._waiting_readers == 1))
+        self.hold(lock.write, second, Event())
+        self.assertTrue(wait_for(lambda: lock._waiting_writers == 1))
+        release_first.set()
+        self.assertTrue(reading.wait(10))
+        sleep(0.1)
+        self.assertFalse(second.is_set())
+        release_reader.set()
+        self.assertTrue(second.wait(10))
+
+    def test_writer_coming_straight_back_does_not_starve_readers(self):
+        """Tests that a reader gets in between the writes of a writer that keeps taking the lock."""
+        lock = ReadWriteLock()
+        stop, reading = Event(), Event()
+
+        def write():
+            while not stop.is_set():
+                with lock.write():
+                    pass
+
+        writer = Thread(target=write, daemon=True)
+        writer.start()
+        release = Event()
+        self.hold(lock.read, reading, release)
+        self.assertTrue(reading.wait(10))
+        stop.set()
+        release.set()
+        writer.join(10)
+        self.assertFalse(writer.is_alive())
@@ -0,0 +1,101 @@
+from blkchn import Blockchain, encoding
+from blkchn.mempool import LOWEST_FEE, Mempool, MempoolFull, txid
+from test.helpers import payment, reward
+
+from unittest import TestCase
+
+
+class TestMempool(TestCase):
+
+    def test_duplicates_are_ignored(self):
+        """Tests that a transaction already pending is not added twice."""
+        mempool = Mempool()
+        self.assertTrue(mempool.add(payment('a', 'b', 1)))
+        self.assertFalse(mempool.add(payment('a', 'b', 1)))
+        self.assertEqual(len(mempool), 1)
+
+    def test_lookup_by_id(self):
+        """Tests that a pending transaction can be looked up by the hash of its content."""
+        mempool = Mempool()
+        mempool.add(payment('a', 'b', 1))
+        self.assertEqual(mempool.get(txid(payment('a', 'b', 1)))['amount'], 1)
+        self.assertIsNone(mempool.get(txid(payment('a', 'b', 2))))
+
+    def test_oldest_are_evicted(self):
+        """Tests that the oldest transactions make way for new ones once the count limit is reached."""
+        mempool = Mempool(max_count=3)
+        for amount in range(5):
+            mempool.add(payment('a', 'b', amount))
+        self.assertEqual([transaction['amount'] for transaction in mempool], [2, 3, 4])
+
+    def test_byte_limit(self):
+        """Tests that the encoded size of the pending transactions stays within the byte limit."""
+        size = len(encoding.encode_transaction(payment('a', 'b', 0)))
+        mempool = Mempool(max_bytes=size * 2)
+        for amount in range(4):
+            mempool.add(payment('a', 'b', amount))
+        self.assertEqual(len(mempool), 2)
+        self.assertLessEqual(mempool.bytes, size * 2)
+
+    def test_lowest_fee_are_evicted(self):
+        """Tests that the cheapest transactions are evicted, and that a cheaper one is refused outright."""
+        mempool = Mempool(max_count=2, eviction=LOWEST_FEE)
+        mempool.add(payment('a', 'b', 1, fee=5))
+        mempool.add(payment('a', 'b', 2, fee=1))
+        mempool.add(payment('a', 'b', 3, fee=3))
+        self.assertEqual(sorted(transaction['fee'] for transaction in mempool), [3, 5])
+
+        with self.assertRaises(MempoolFull):
+            mempool.add(payment('a', 'b', 4, fee=2))
+        self.assertEqual(len(mempool), 2)
+
+    def test_invalid_fee(self):
+        """Tests that a transaction offering a negative or non-finite fee is refused."""
+        mempool = Mempool()
+
+        for invalid in (-1, float('nan'), float('inf')):
+            with self.assertRaises(ValueError):
+                mempool.add(payment('a', 'b', 1, fee=invalid))
+
+        self.assertEqual(len(mempool), 0)
+
+    def test_new_block_drains_mempool(self):
+        """Tests that forging a block takes every pending transaction, followed by the reward."""
+        blockchain = Blockchain(difficulty=1)
+        blockchain.new_transaction(payment('a', 'b', 1))
+        blockchain.new_transaction(payment('a', 'b', 1))
+        block = blockchain.new_block(100, None, reward=reward(amount=1))
+        self.assertEqual([transaction['amount'] for transaction in block['transactions']], [1, 1])
+        self.assertEqual(block['transactions'][-1]['recipient'], 'miner')
+        self.assertEqual(len(blockchain.mempool), 0)
+
+    def test_select_takes_best_fee_per_byte(self):
+        """Tests that block assembly takes the best paying transactions that fit and leaves the rest pending."""
+        mempool = Mempool()
+        for amount, fee in enumerate([1, 9, 5, 7]):
+            mempool.add(payment('a', 'b', amount, fee=fee))
+        size = len(encoding.encode_transaction(payment('a', 'b', 0, fee=1)))
+        selected = mempool.select(size * 2)
+        self.assertEqual([transaction['fee'] for transaction in selected], [9, 7])
+        self.assertEqual(sorted(transaction['fee'] for transaction in mempool), [1, 5])
+
+    def test_select_passes_over_large_transactions(self):
+        """Tests that a transaction too large for what is left of a block does not stop smaller ones."""
+        mempool = Mempool()
+        mempool.add(dict(payment('a', 'b', 0, fee=100), memo='x' * 100))
+        mempool.add(payment('a', 'b', 1, fee=1))
+        selected = mempool.select(len(encoding.encode_transaction(payment('a', 'b', 1, fee=1))))
+        self.assertEqual([transaction['amount'] for transaction in selected], [1])
+        self.assertEqual(len(mempool), 1)
+
+    def test_new_block_respects_max_block_size(self):
+        """Tests that a block with a size limit holds the reward and leaves what does not fit pending."""
+        miner_reward = reward(amount=1)
+        size = len(encoding.encode_transaction(payment('a', 'b', 0, fee=1)))
+        blockchain = Blockchain(difficulty=1, max_block_size=len(encoding.encode_transaction(miner_reward)) + size)
+        blockchain.new_transaction(payment('a', 'b', 0, fee=1))
+        blockchain.new_transaction(payment('a', 'b', 1, fee=2))
+        block = blockchain.new_block(blockchain.proof_of_work(blockchain.last_block), None, miner_reward)
+        self.assertEqual([transaction['fee'] for transaction in block['transactions'][:-1]], [2])
+        self.assertEqual(len(blockchain.mempool), 1)
+        self.assertTrue(blockchain.valid_chain(blockchain.chain, start=1))
@@ -0,0 +1,43 @@
+from blkchn import Blockchain, merkle
+from blkchn.block import Block
+from test.helpers import mine, payment
+
+from unittest import TestCase
+
+
+class TestMerkle(TestCase):
+
+    def test_every_proof_verifies(self):
+        """Tests that the inclusion proof of every transaction verifies, for odd and even sized trees."""
+        for size in range(1, 10):
+            transactions = [{'sender': 'a', 'recipient': 'b', 'amount': n} for n in range(size)]
+            root = merkle.root(transactions)
+
+            for position, transaction in enumerate(transactions):
+                path = merkle.proof(transactions, position)
+                self.assertLessEqual(len(path), size.bit_length())
+                self.assertTrue(merkle.verify(transaction, path, root))
+
+    def test_proof_rejects_other_transaction(self):
+        """Tests that a proof does not verify a transaction that is not in the block."""
+        transactions = [{'amount': n} for n in range(4)]
+        path = merkle.proof(transactions, 1)
+        self.assertFalse(merkle.verify({'amount': 100}, path, merkle.root(transactions)))
+
+    def test_blockchain_proof(self):
+        """Tests that a proof served for a mined block verifies against its header."""
+        blockchain = Blockchain(difficulty=1)
+        for n in range(3):
+            blockchain.new_transaction({'sender': 'a', 'recipient': 'b', 'amount': n})
+        block = blockchain.new_block(100, None)
+        proof = blockchain.merkle_proof(block['index'], 2)
+        self.assertTrue(merkle.verify(proof['transaction'], proof['proof'], block.header['merkle_root']))
+
+    def test_valid_chain_rejects_swapped_transactions(self):
+        """Tests that transactions which do not match the Merkle root invalidate a chain."""
+        blockchain = Blockchain(difficulty=1)
+        block = mine(blockchain, transactions=[payment('a', 'b', 1)])
+        forged = Block(dict(block.to_dict(), transactions=[{'sender': 'a', 'recipient': 'c', 'amount': 1}]))
+        self.assertEqual(forged.hash, block.hash)
+        self.assertTrue(blockchain.valid_chain(blockchain.chain, start=1))
+        self.assertFalse(blockchain.valid_chain([blockchain.chain[0], forged], start=1))
@@ -0,0 +1,48 @@
+from blkchn import Blockchain, mining
+
+from unittest import TestCase
+
+
+class TestMining(TestCase):
+
+    def test_scan_matches_valid_proof(self):
+        """Tests that the midstate search finds the first nonce accepted by `Blockchain.valid_proof`."""
+        last_hash = Blockchain.hash({'index': 1})
+        proof = mining.scan(100, last_hash)
+        self.assertTrue(Blockchain.valid_proof(100, proof, last_hash))
+        self.assertFalse(any(Blockchain.valid_proof(100, nonce, last_hash) for nonce in range(proof)))
+
+    def test_scan_can_be_stopped(self):
+        """Tests that a search returns None once its stop condition is met."""
+        self.assertIsNone(mining.scan(100, Blockchain.hash({'index': 1}), stop=lambda: True))
+
+    def test_search_finds_valid_proof(self):
+        """Tests that a proof found across several processes satisfies the validation rule."""
+        last_hash = Blockchain.hash({'index': 1})
+        proof = mining.search(100, last_hash, workers=2)
+        self.assertTrue(Blockchain.valid_proof(100, proof, last_hash))
+
+    def test_searcher_is_reused_across_searches(self):
+        """Tests that one pool of processes serves search after search, including ones that were stopped."""
+        searcher = mining.Searcher(workers=2).start()
+        processes = list(searcher.processes)
+
+        try:
+            self.assertIsNone(searcher.search(100, Blockchain.hash({'index': 1}), difficulty=60, stop=lambda: True))
+
+            for index in range(2, 5):
+                last_hash = Blockchain.hash({'index': index})
+                proof = searcher.search(index, last_hash, difficulty=8)
+                self.assertTrue(Blockchain.valid_proof(index, proof, last_hash, 8))
+        finally:
+            searcher.close()
+
+        self.assertEqual(searcher.processes, processes)
+        self.assertFalse(any(process.is_alive() for process in processes))
+
+    def test_proof_of_work_with_workers(self):
+        """Tests that a multi-worker Blockchain still produces a valid proof for the last block."""
+        blockchain = Blockchain(workers=2)
+        last_block = blockchain.last_block
+        proof = blockchain.proof_of_work(last_block)
+        self.assertTrue(blockchain.valid_proof(last_block['proof'], proof, blockchain.hash(last_block)))
@@ -0,0 +1,255 @@
+from app import app as api
+from blkchn import Blockchain
+from blkchn.block import Block
+from blkchn.peers import Peers, parse_blocks
+from requests import HTTPError, Timeout
+from test.helpers import mine
+
+from io import BytesIO
+from time import sleep, time
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+
+def serve(blockchain):
+    """Returns a stand-in for `Session.get` that answers requests with the API, backed by `blockchain`."""
+    client = api.app.test_client()
+
+    def get(url, timeout=None, params=None, stream=False):
+        with patch.object(api, 'blockchain', blockchain):
+            response = client.get('/' + url.split('/', 3)[3], query_string=params)
+            data = response.get_data()
+
+        body = BytesIO(data)
+
+        return Mock(status_code=response.status_code, headers=response.headers, content=data,
+                    raw=Mock(read1=Mock(side_effect=lambda amount, decode_content=False: body.read1(amount))),
+                    json=Mock(return_value=response.get_json(silent=True)),
+                    raise_for_status=Mock(side_effect=HTTPError() if response.status_code >= 400 else None))
+
+    return get
+
+
+class TestPeers(TestCase):
+
+    def setUp(self):
+        self.peers = Peers(deadline=0.5)
+
+    def test_gather_skips_failed_nodes(self):
+        """Tests that a node raising an error is skipped rather than failing the round."""
+        def fetch(node):
+            if node == 'bad':
+                raise ValueError('not JSON')
+            if node == 'malformed':
+                raise TypeError('not a block')
+            return node
+
+        self.assertEqual(dict(self.peers.gather(['good', 'bad', 'malformed'], fetch)), {'good': 'good'})
+
+    def test_gather_abandons_slow_nodes(self):
+        """Tests that nodes still outstanding at the deadline are ignored."""
+        def fetch(node):
+            if node == 'slow':
+                sleep(2)
+            return node
+
+        self.assertEqual(dict(self.peers.gather(['fast', 'slow'], fetch)), {'fast': 'fast'})
+
+    def test_get_uses_timeouts(self):
+        """Tests that every request carries the per-node connect and read timeouts."""
+        with patch.object(self.peers.session, 'get') as get:
+            self.peers.get('node:5000', '/chain')
+            get.assert_called_once_with('http://node:5000/chain', timeout=(3.05, 10))
+
+
+class TestResolveConflicts(TestCase):
+
+    def test_longer_valid_chain_replaces_ours(self):
+        """Tests that consensus adopts a longer valid chain fetched from a node."""
+        theirs = Blockchain(difficulty=8)
+        mine(theirs, 2)
+        ours = Blockchain(difficulty=8)
+        ours.chain = [theirs.chain[0]]
+        ours.register_node('peer:5000')
+
+        with patch.object(ours.peers.session, 'get', side_effect=serve(theirs)):
+            self.assertTrue(ours.resolve_conflicts(headers_first=False))
+
+        self.assertEqual([block.hash for block in ours.chain], [block.hash for block in theirs.chain])
+
+    def test_streamed_chain_with_invalid_block_is_rejected(self):
+        """Tests that a streamed chain is abandoned at the first block that fails validation."""
+        theirs = Blockchain(difficulty=8)
+        mine(theirs, 3)
+        forged = Blockchain(difficulty=8)
+        forged.chain = theirs.chain[:2] + [Block(dict(theirs.chain[2].to_dict(), transactions=[{'amount': 1}]))]
+        forged.chain.append(theirs.chain[3])
+        ours = Blockchain(difficulty=8)
+        ours.chain = [theirs.chain[0]]
+        ours.register_node('peer:5000')
+
+        with patch.object(ours.peers.session, 'get', side_effect=serve(forged)):
+            self.assertFalse(ours.resolve_conflicts(headers_first=False))
+
+        self.assertEqual(len(ours.chain), 1)
+
+    def test_malformed_chain_only_skips_its_node(self):
+        """Tests that blocks a node cannot have meant are skipped, rather than failing the round."""
+        ours = Blockchain(difficulty=8)
+        ours.register_node('peer:5000')
+        block = dict(ours.chain[0].to_dict(), index=2, transactions=5, created_at='x')
+        response = Mock(headers={'Content-Type': 'application/json'}, raise_for_status=Mock(),
+                        json=Mock(return_value={'chain': [block], 'start': 2, 'length': 2}))
+
+        with patch.object(ours.peers.session, 'get', return_value=response):
+            self.assertFalse(ours.resolve_conflicts(headers_first=False))
+
+        self.assertEqual(len(ours.chain), 1)
+
+    def test_forged_genesis_does_not_replace_our_chain(self):
+        """Tests that a chain that does not share our genesis block is ignored, whatever work it claims."""
+        ours = Blockchain(difficulty=8)
+        ours.register_node('peer:5000')
+        mine(ours, 2)
+        forged = Block(dict(ours.chain[0].to_dict(), difficulty=255, proof=1))
+
+        with patch.object(ours.peers, 'fetch_headers', return_value=(1, [forged.header])), \
+                patch.object(ours.peers, 'fetch_blocks', return_value=[forged]):
+            self.assertFalse(ours.resolve_conflicts(headers_first=True))
+
+        with patch.object(ours.peers, 'stream_chain', return_value=(1, 1, (block for block in [forged]))):
+            self.assertFalse(ours.resolve_conflicts(headers_first=False))
+
+        self.assertEqual(len(ours.chain), 3)
+
+    def test_malformed_headers_only_skip_their_node(self):
+        """Tests that headers too malformed to check are skipped, rather than failing the round."""
+        ours = Blockchain(difficulty=8)
+        ours.register_node('peer:5000')
+        genesis = ours.chain[0].header
+
+        for headers in ([{'index': 2}], [dict(genesis, index=2, previous_hash=genesis['hash'], created_at='x')],
+                        [dict(genesis, index=2, previous_hash=genesis['hash'], difficulty='8')], [5]):
+            with patch.object(ours.peers, 'fetch_headers', return_value=(2, headers)):
+                self.assertFalse(ours.resolve_conflicts())
+
+        self.assertEqual(len(ours.chain), 1)
+
+    def test_streamed_chain_is_abandoned_at_the_deadline(self):
+        """Tests that a node still sending blocks at the deadline is dropped and its stream closed."""
+        theirs = Blockchain(difficulty=8)
+        mine(theirs, 2)
+        ours = Blockchain(difficulty=8)
+        ours.chain = [theirs.chain[0]]
+        closed = []
+
+        def blocks():
+            try:
+                yield from theirs.chain[1:]
+            finally:
+                closed.append(True)
+
+        with patch.object(ours.peers, 'stream_chain', return_value=(2, 3, blocks())):
+            self.assertIsNone(ours._fetch_valid_chain('peer:5000', ours.locator(), deadline=time() - 1))
+
+        self.assertEqual(closed, [True])
+
+    def test_deadline_is_checked_within_a_block(self):
+        """Tests that a node trickling out a single block is abandoned at the deadline, not once it ends."""
+        peers = Peers()
+        reads = []
+
+        def read1(amount, decode_content=False):
+            reads.append(amount)
+            sleep(0.05)
+            # A record declaring a kilobyte long block, whose bytes then arrive one at a time
+            return b'\x00\x00\x04\x00' if len(reads) == 1 else b'\x01'
+
+        response = Mock(headers={'Content-Type': 'application/octet-stream'}, raise_for_status=Mock(),
+                        raw=Mock(read1=Mock(side_effect=read1)))
+
+        with patch.object(peers.session, 'get', return_value=response):
+            _, _, blocks = peers.stream_chain('peer:5000', deadline=time() + 0.2)
+
+            with self.assertRaises(Timeout):
+                list(blocks)
+
+        self.assertLess(len(reads), 10)
+        response.close.assert_called_once_with()
+
+    def test_headers_first_fetches_blocks_after_fork(self):
+        """Tests that headers first sync only downloads the blocks we do not already have."""
+        theirs = Blockchain(difficulty=8)
+        mine(theirs, 3)
+        ours = Blockchain(difficulty=8)
+        ours.chain = theirs.chain[:2]
+        ours.register_node('peer:5000')
+
+        with patch.object(ours.peers.session, 'get', side_effect=serve(theirs)) as get:
+            self.assertTrue(ours.resolve_conflicts())
+
+        get.assert_called_with('http://peer:5000/chain', timeout=(3.05, 10),
+                               params={'format': 'binary', 'since': theirs.chain[1].hash, 'limit': 2}, stream=True)
+        self.assertEqual([block.hash for block in ours.chain], [block.hash for block in theirs.chain])
+
+    def test_headers_first_rejects_blocks_not_matching_headers(self):
+        """Tests that blocks which differ from the headers that were validated are not adopted."""
+        theirs = Blockchain(difficulty=8)
+        mine(theirs, 2)
+        ours = Blockchain(difficulty=8)
+        ours.chain = theirs.chain[:1]
+        ours.register_node('peer:5000')
+        forged = Blockchain(difficulty=8)
+        forged.chain = theirs.chain[:-1] + [Block(dict(theirs.chain[-1].to_dict(), transactions=[{'amount': 100}]))]
+        headers, blocks = serve(theirs), serve(forged)
+
+        def tampered(url, timeout=None, params=None, stream=False):
+            return (blocks if url.endswith('/chain') else headers)(url, timeout, params)
+
+        with patch.object(ours.peers.session, 'get', side_effect=tampered):
+            self.assertFalse(ours.resolve_conflicts())
+
+        self.assertEqual(len(ours.chain), 1)
+
+
+class TestLocator(TestCase):
+
+    def setUp(self):
+        self.blockchain = Blockchain(difficulty=1)
+        mine(self.blockchain, 40)
+
+    def test_locator_steps_back_exponentially(self):
+        """Tests that the locator lists recent blocks densely, then sparsely, ending at the genesis block."""
+        positions = [self.blockchain.position({block_hash}) for block_hash in self.blockchain.locator()]
+        self.assertEqual(positions, [40, 39, 38, 37, 36, 35, 34, 33, 32, 31, 29, 25, 17, 1, 0])
+
+    def test_locate_finds_fork_point(self):
+        """Tests that a node finds the block after the last one it shares with a diverged chain."""
+        other = Blockchain(difficulty=1)
+        other.chain = self.blockchain.chain[:20]
+        other.new_transaction({'sender': 'a', 'recipient': 'b', 'amount': 1})
+        mine(other, 5)
+        self.assertEqual(self.blockchain.locate(other.locator()), 20)
+        self.assertEqual(self.blockchain.locate(Blockchain(difficulty=2).locator()), 0)
+
+    def test_delta_sync_splices_divergent_suffix(self):
+        """Tests that a node which forked from a peer adopts only the peer's blocks after the fork."""
+        ours = Blockchain(difficulty=1)
+        ours.chain = self.blockchain.chain[:30]
+        ours.new_transaction({'sender': 'a', 'recipient': 'b', 'amount': 1})
+        mine(ours, 2)
+        ours.register_node('peer:5000')
+
+        get = serve(self.blockchain)
+        served = []
+
+        def recording(url, timeout=None, params=None, stream=False):
+            start, blocks = parse_blocks(get(url, timeout, params))
+            served.append((start, len(blocks)))
+            return get(url, timeout, params)
+
+        with patch.object(ours.peers.session, 'get', side_effect=recording):
+            self.assertTrue(ours.resolve_conflicts(headers_first=False))
+
+        self.assertEqual(served, [(31, 11)])
+        self.assertEqual([block.hash for block in ours.chain], [block.hash for block in self.blockchain.chain])
@@ -0,0 +1,106 @@
+from blkchn import Blockchain
+from blkchn.storage import SegmentStore, Splice
+from test.helpers import mine
+
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+
+class TestSegmentStore(TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.store = SegmentStore(self.directory.name, sync_every=2)
+        self.blockchain = Blockchain(difficulty=1, storage=self.store)
+
+        mine(self.blockchain, 4)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_reopen_restores_chain(self):
+        """Tests that a chain reopened from its store has the same blocks and no new genesis block."""
+        hashes = [block.hash for block in self.blockchain.chain]
+        last_block = self.blockchain.last_block
+        self.store.close()
+        self.store = SegmentStore(self.directory.name)
+        reopened = Blockchain(difficulty=1, storage=self.store)
+        self.assertEqual([block.hash for block in reopened.chain], hashes)
+        self.assertEqual(reopened.last_block, last_block)
+        self.assertTrue(reopened.valid_chain(reopened.chain, start=1))
+
+    def test_truncate_removes_tail(self):
+        """Tests that removing the tail of the chain also removes it from disk."""
+        del self.store[2:]
+        self.store.close()
+        self.store = SegmentStore(self.directory.name)
+        self.assertEqual(len(self.store), 2)
+
+        with self.assertRaises(ValueError):
+            del self.store[0:1]
+
+    def test_recovers_from_torn_write(self):
+        """Tests that a partially written block is discarded when the store is reopened."""
+        last_hash = self.blockchain.last_block.hash
+        self.store.close()
+
+        with open(os.path.join(self.directory.name, 'blocks.dat'), 'ab') as segment:
+            segment.write(b'\x00\x00\x01\x00partial')
+
+        self.store = SegmentStore(self.directory.name)
+        self.assertEqual(len(self.store), 5)
+        self.assertEqual(self.store[-1].hash, last_hash)
+
+    def test_reopen_loads_hash_index_without_reading_blocks(self):
+        """Tests that a reopened chain's hash index comes from the hash file, not from decoding blocks."""
+        positions = dict(self.blockchain.positions)
+        self.store.close()
+        self.store = SegmentStore(self.directory.name)
+
+        with patch.object(SegmentStore, '_read', side_effect=AssertionError('block read')):
+            self.store.hot.clear()
+            reopened = Blockchain(difficulty=1, storage=self.store)
+            self.assertEqual(reopened.positions, positions)
+
+    def test_missing_hashes_are_rebuilt(self):
+        """Tests that block hashes missing from the hash file are rebuilt from the records when reopened."""
+        hashes = [block.hash for block in self.blockchain.chain]
+        self.store.close()
+
+        with open(os.path.join(self.directory.name, 'blocks.hashes'), 'r+b') as hash_file:
+            hash_file.truncate(64 + 5)
+
+        self.store = SegmentStore(self.directory.name)
+        self.assertEqual(list(self.store.hashes()), hashes)
+        self.assertEqual(os.path.getsize(os.path.join(self.directory.name, 'blocks.hashes')), 32 * len(hashes))
+        del self.store[3:]
+        self.assertEqual(list(self.store.hashes()), hashes[:3])
+
+    def test_hot_window_is_bounded(self):
+        """Tests that only the most recent blocks are kept as live objects, and older ones are read from disk."""
+        hashes = [block.hash for block in self.blockchain.chain]
+        self.store.close()
+        self.store = SegmentStore(self.directory.name, hot_blocks=2)
+        blockchain = Blockchain(difficulty=1, storage=self.store)
+        self.assertEqual(self.store.hot, {})
+
+        last_block = blockchain.last_block
+        self.assertEqual(sorted(self.store.hot), [4])
+        blockchain.new_block(blockchain.proof_of_work(last_block), blockchain.hash(last_block))
+        self.assertEqual(sorted(self.store.hot), [4, 5])
+        self.assertIs(self.store[-1], blockchain.last_block)
+        self.assertEqual([block.hash for block in self.store][:5], hashes)
+        self.assertEqual(sorted(self.store.hot), [4, 5])
+
+
+class TestSplice(TestCase):
+
+    def test_splice(self):
+        """Tests that a splice reads its prefix from one chain and the rest from the new blocks."""
+        splice = Splice(['a', 'b', 'c'], 2, ['x', 'y'])
+        self.assertEqual(list(splice), ['a', 'b', 'x', 'y'])
+        self.assertEqual(splice[-1], 'y')
+        self.assertEqual(splice[1:3], ['b', 'x'])
@@ -0,0 +1,36 @@
+from blkchn import Blockchain, validation
+from test.helpers import mine
+
+from unittest import TestCase
+
+
+class TestValidation(TestCase):
+
+    def setUp(self):
+        self.blockchain = Blockchain(difficulty=1)
+
+        mine(self.blockchain, 12)
+
+        self.chain = [block.to_dict() for block in self.blockchain.chain]
+
+    def test_check_links(self):
+        """Tests that a run of valid blocks passes, and a broken link fails."""
+        self.assertTrue(validation.check_links(self.chain))
+        self.chain[5] = dict(self.chain[5], previous_hash='0')
+        self.assertFalse(validation.check_links(self.chain))
+
+    def test_blocks_must_be_numbered_by_position(self):
+        """Tests that a block whose index does not follow its position invalidates the chain."""
+        self.chain[-1] = dict(self.chain[-1], index=2)
+        self.assertFalse(validation.check_links(self.chain))
+        self.assertFalse(validation.check_links_parallel(self.chain, workers=2, chunk_size=3))
+        self.assertFalse(self.blockchain.valid_chain(self.chain, start=1))
+        self.assertTrue(validation.check_links(self.chain[:-1]))
+
+    def test_parallel_matches_sequential(self):
+        """Tests that checking in parallel chunks agrees with the sequential reference implementation."""
+        self.assertTrue(self.blockchain.valid_chain_parallel(self.chain, start=1, workers=2))
+        self.assertTrue(validation.check_links_parallel(self.chain, workers=2, chunk_size=3))
+        self.chain[7] = dict(self.chain[7], transactions=[{'amount': 1}])
+        self.assertFalse(self.blockchain.valid_chain(self.chain, start=1))
+        self.assertFalse(validation.check_links_parallel(self.chain, workers=2, chunk_size=3))